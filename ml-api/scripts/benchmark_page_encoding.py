@@ -0,0 +1,115 @@
+"""
+Compare page image encodings for VLM OCR: bytes per page, encode time and (optionally) OCR latency.
+
+Run from the /ml-api directory, e.g.:
+
+    python scripts/benchmark_page_encoding.py
+    python scripts/benchmark_page_encoding.py --ocr  # also measures OCR latency, needs VLLM_VLM_URL
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from ml_api.config import settings
+from ml_api.ingestion.vlm.rolmocr_utils import (
+    do_ocr_on_image,
+    get_pdf_page_count,
+    get_render_dpi,
+    image_mime_type,
+    render_pdf_page_base64,
+)
+from openai import OpenAI
+
+DEFAULT_PDF = (
+    Path(__file__).parents[2]
+    / "resources/TEST_DATA/p10051_doc4__10051-2018-05-18-145457-GEFReviewSheetGEF61.pdf"
+)
+
+# (format, quality, max_pixels), max_pixels=0 renders at PDF_2_PNG_DPI without resizing
+ENCODINGS = [
+    ("PNG", 0, 0),
+    ("PNG", 0, 1280 * 28 * 28),
+    ("JPEG", 90, 1280 * 28 * 28),
+    ("JPEG", 75, 1280 * 28 * 28),
+    ("WEBP", 90, 1280 * 28 * 28),
+    ("WEBP", 75, 1280 * 28 * 28),
+    ("JPEG", 90, 768 * 28 * 28),
+]
+
+
+def benchmark_encoding(
+    pdf_path: Path,
+    image_format: str,
+    quality: int,
+    max_pixels: int,
+    client: OpenAI | None = None,
+) -> dict:
+    page_count = get_pdf_page_count(pdf_path)
+    dpi = get_render_dpi(pdf_path, max_pixels=max_pixels)
+
+    page_bytes = []
+    encode_seconds = []
+    ocr_seconds = []
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        for page_number in range(1, page_count + 1):
+            start = time.perf_counter()
+            image = render_pdf_page_base64(
+                pdf_path,
+                page_number,
+                output_folder,
+                dpi=dpi,
+                image_format=image_format,
+                quality=quality,
+                max_pixels=max_pixels,
+            )
+            encode_seconds.append(time.perf_counter() - start)
+            page_bytes.append(len(image) * 3 // 4)  # decoded size of the base64 string
+
+            if client is not None:
+                start = time.perf_counter()
+                do_ocr_on_image(image, client, mime_type=image_mime_type(image_format))
+                ocr_seconds.append(time.perf_counter() - start)
+
+    return {
+        "encoding": f"{image_format} q={quality} max_pixels={max_pixels}",
+        "dpi": dpi,
+        "kb_per_page": statistics.mean(page_bytes) / 1024,
+        "render_encode_s_per_page": statistics.mean(encode_seconds),
+        "ocr_s_per_page": statistics.mean(ocr_seconds) if ocr_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdf", type=Path, default=DEFAULT_PDF)
+    parser.add_argument(
+        "--ocr", action="store_true", help="Also measure OCR latency on the VLM."
+    )
+    args = parser.parse_args()
+
+    client = None
+    if args.ocr:
+        client = OpenAI(base_url=settings.VLLM_VLM_URL, api_key=settings.VLLM_API_KEY)
+
+    print(
+        f"{'encoding':<40} {'dpi':>5} {'KB/page':>10} {'render+encode s':>16} {'ocr s':>8}"
+    )
+    for image_format, quality, max_pixels in ENCODINGS:
+        result = benchmark_encoding(args.pdf, image_format, quality, max_pixels, client)
+        ocr = (
+            f"{result['ocr_s_per_page']:.2f}"
+            if result["ocr_s_per_page"] is not None
+            else "-"
+        )
+        print(
+            f"{result['encoding']:<40} {result['dpi']:>5} {result['kb_per_page']:>10.1f} "
+            f"{result['render_encode_s_per_page']:>16.3f} {ocr:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
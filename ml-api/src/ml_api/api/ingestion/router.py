@@ -1,40 +1,68 @@
 from fastapi import APIRouter, BackgroundTasks
 from ml_api.api.schemas import IngestionRequest
 from ml_api.api.tasks import ingest_projects_background
-from ml_api.ingestion import NaiveIngestionService, VLMIngestionService
+from ml_api.ingestion import (
+    BaseIngestionService,
+    HybridIngestionService,
+    NaiveIngestionService,
+    VLMIngestionService,
+)
+from ml_api.jobs import INGEST_PROJECTS, JobPriority, get_job_queue
 
 router = APIRouter(prefix="/ingestion")
 
 
-@router.post("/projects")
-async def ingest_data(request: IngestionRequest, background_tasks: BackgroundTasks):
-    """Ingests data into the system."""
+def start_ingestion(
+    project_ids: list[str],
+    service_name: str,
+    service_cls: type[BaseIngestionService],
+    background_tasks: BackgroundTasks,
+) -> dict[str, str]:
+    """Queues an ingestion job, or runs it in the background if there is no job queue."""
 
-    service = NaiveIngestionService()
+    queue = get_job_queue()
+    if queue is not None:
+        job_id = queue.enqueue(
+            INGEST_PROJECTS,
+            {"project_ids": project_ids, "service": service_name},
+            priority=JobPriority.INGESTION,
+        )
+        return {
+            "message": f"Ingestion queued. Project IDs: {project_ids}",
+            "job_id": job_id,
+        }
 
-    background_tasks.add_task(
-        ingest_projects_background,
-        request.project_ids,
-        service,
-    )
+    background_tasks.add_task(ingest_projects_background, project_ids, service_cls())
 
     return {
-        "message": f"Ingestion service initialized and running in the background. Project IDs: {request.project_ids}"
+        "message": f"Ingestion service initialized and running in the background. Project IDs: {project_ids}"
     }
 
 
+@router.post("/projects")
+async def ingest_data(request: IngestionRequest, background_tasks: BackgroundTasks):
+    """Ingests data into the system."""
+
+    return start_ingestion(
+        request.project_ids, "naive", NaiveIngestionService, background_tasks
+    )
+
+
 @router.post("/projects/vlm")
 async def ingest_data_vlm(request: IngestionRequest, background_tasks: BackgroundTasks):
     """Ingests data into the system."""
 
-    service = VLMIngestionService()
-
-    background_tasks.add_task(
-        ingest_projects_background,
-        request.project_ids,
-        service,
+    return start_ingestion(
+        request.project_ids, "vlm", VLMIngestionService, background_tasks
     )
 
-    return {
-        "message": f"Ingestion service initialized and running in the background. Project IDs: {request.project_ids}"
-    }
+
+@router.post("/projects/hybrid")
+async def ingest_data_hybrid(
+    request: IngestionRequest, background_tasks: BackgroundTasks
+):
+    """Ingests data into the system, only OCR'ing pages without a usable text layer."""
+
+    return start_ingestion(
+        request.project_ids, "hybrid", HybridIngestionService, background_tasks
+    )
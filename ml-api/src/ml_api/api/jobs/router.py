@@ -0,0 +1,30 @@
+from dataclasses import asdict
+
+from fastapi import APIRouter, HTTPException
+from ml_api.jobs import JobQueue, JobStatus, get_job_queue
+
+router = APIRouter(prefix="/jobs")
+
+
+def _get_queue() -> JobQueue:
+    queue = get_job_queue()
+    if queue is None:
+        raise HTTPException(status_code=404, detail="The job queue is disabled.")
+    return queue
+
+
+@router.get("")
+async def list_jobs(status: JobStatus | None = None, limit: int = 100):
+    """Lists the most recent jobs, optionally with a given status."""
+
+    return [asdict(job) for job in _get_queue().list(status=status, limit=limit)]
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Gets the status, progress and result of a job."""
+
+    job = _get_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return asdict(job)
@@ -1,11 +1,23 @@
 import asyncio
+import json
 import logging
 
 from fastapi import APIRouter, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from ml_api.api.tasks import generate_rag_response_and_post
-from ml_api.rag_inference.rag_service import generate_rag_response
-
-from .schemas import GEFRagRequest, GEFRagRequestBatch, GEFRagResponse
+from ml_api.jobs import RAG_RESPONSE, JobPriority, get_job_queue
+from ml_api.rag_inference.rag_service import (
+    generate_rag_responses,
+    stream_rag_responses,
+)
+from ml_api.retrieval.cache import cache_stats
+
+from .schemas import (
+    GEFRagRequest,
+    GEFRagRequestBatch,
+    GEFRagResponse,
+    GEFRagStreamRequest,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +35,12 @@ async def healthcheck_sleep(sleep_time: int):
     return {"status": "ok"}
 
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit rates and sizes of the in-process retrieval caches."""
+    return cache_stats()
+
+
 @router.post("/generate_rag_response_batch")
 async def generate_rag_response_request(request: GEFRagRequestBatch) -> GEFRagResponse:
     """Generates a RAG response for a single question in a specific GEF project."""
@@ -32,9 +50,7 @@ async def generate_rag_response_request(request: GEFRagRequestBatch) -> GEFRagRe
     questions = request.questions
     project_id = request.project_id
 
-    responses = await asyncio.gather(
-        *[generate_rag_response(question, project_id) for question in questions]
-    )
+    responses = await generate_rag_responses(questions, project_id)
 
     response_dict = {
         question: response for question, response in zip(questions, responses)
@@ -43,12 +59,50 @@ async def generate_rag_response_request(request: GEFRagRequestBatch) -> GEFRagRe
     return GEFRagResponse(answers=response_dict)
 
 
+@router.post("/generate_rag_response_stream")
+async def generate_rag_response_stream(request: GEFRagStreamRequest):
+    """Streams RAG responses for several questions in a specific GEF project as NDJSON.
+
+    Each line is an event, see stream_rag_responses. Answers are sent as soon as each question
+    completes, and with stream_tokens the tokens of each answer as they are generated.
+    """
+
+    async def _ndjson():
+        async for event in stream_rag_responses(
+            request.questions, request.project_id, request.stream_tokens
+        ):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
+
+
 @router.post("/generate_rag_response")
 async def generate_rag_response_single(
     request: GEFRagRequest,
     background_tasks: BackgroundTasks,
 ):
-    """Generates a RAG response for a single question and posts it to an external API in the background."""
+    """Generates a RAG response for a single question and posts it to an external API in the background.
+
+    With a job queue the request is queued as a job, ahead of ingestion jobs, and its job ID is
+    returned.
+    """
+
+    queue = get_job_queue()
+    if queue is not None:
+        job_id = queue.enqueue(
+            RAG_RESPONSE,
+            {
+                "question": request.question,
+                "project_id": "9467",
+                "source": request.source,
+                "workspace": request.workspace,
+            },
+            priority=JobPriority.RAG,
+        )
+        return {
+            "message": "RAG response generation and posting to external API queued.",
+            "job_id": job_id,
+        }
 
     background_tasks.add_task(
         generate_rag_response_and_post,
@@ -12,6 +12,10 @@ class GEFRagRequest(BaseModel):
     # project_id: str = "9467"
 
 
+class GEFRagStreamRequest(GEFRagRequestBatch):
+    stream_tokens: bool = True
+
+
 class GEFRagResponse(BaseModel):
     answers: dict[str, str]
 
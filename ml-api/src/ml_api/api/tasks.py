@@ -2,15 +2,63 @@
 
 import asyncio
 import logging
+from typing import Callable
+
 import aiohttp
 
 from ml_api.config import settings
 from ml_api.ingestion import BaseIngestionService
 from ml_api.rag_inference.rag_service import generate_rag_response
+from ml_api.retrieval.cache import invalidate_project
 
 logger = logging.getLogger(__name__)
 
 
+async def post_ai_response(source: str, workspace: str, summary: str):
+    """Posts a RAG response to the SCOPE backend.
+
+    Raises:
+        aiohttp.ClientResponseError: If the backend doesn't accept the response.
+    """
+
+    payload = {
+        # "source_id": int(source),
+        "source": int(source),
+        "workspace": int(workspace),
+        "summary": summary,
+    }
+
+    headers = {
+        "Authorization": f"Token {settings.SCOPE_BACKEND_AUTH_TOKEN}",
+        "Content-Type": "application/json",
+    }
+
+    logger.info(f"Posting response to external API: {payload}")
+
+    async with aiohttp.ClientSession() as session:
+        async with session.post(
+            f"{settings.SCOPE_BACKEND_URL}/api/ai_responses/",
+            json=payload,
+            headers=headers,
+        ) as resp:
+
+            response_text = await resp.text()
+            try:
+                response_json = await resp.json()
+                logger.info(f"Response JSON: {response_json}")
+                logger.info(f"Response text: {response_text}")
+            except:
+                logger.info(f"Response text: {response_text}")
+
+            if resp.status != 200:
+                logger.error(
+                    f"Failed to post response to external API. Status: {resp.status}"
+                )
+            resp.raise_for_status()
+
+            logger.info("Successfully posted response to external API.")
+
+
 async def generate_rag_response_and_post(
     question: str, project_id: str, source: str, workspace: str
 ):
@@ -26,53 +74,42 @@ async def generate_rag_response_and_post(
         return
 
     try:
-        payload = {
-            # "source_id": int(source),
-            "source": int(source),
-            "workspace": int(workspace),
-            "summary": response,
-        }
-
-        headers = {
-            "Authorization": f"Token {settings.SCOPE_BACKEND_AUTH_TOKEN}",
-            "Content-Type": "application/json",
-        }
-
-        logger.info(f"Posting response to external API: {payload}")
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{settings.SCOPE_BACKEND_URL}/api/ai_responses/",
-                json=payload,
-                headers=headers,
-            ) as resp:
-
-                response_text = await resp.text()
-                try:
-                    response_json = await resp.json()
-                    logger.info(f"Response JSON: {response_json}")
-                    logger.info(f"Response text: {response_text}")
-                except:
-                    logger.info(f"Response text: {response_text}")
-
-                if resp.status == 200:
-                    logger.info("Successfully posted response to external API.")
-                else:
-                    logger.error(
-                        f"Failed to post response to external API. Status: {resp.status}"
-                    )
+        await post_ai_response(source, workspace, response)
 
     except Exception as e:
         logger.error(f"Error posting to external API: {e}", stack_info=True)
 
 
-def ingest_projects_background(project_ids: list[str], service: BaseIngestionService):
-    """Ingests data into the system in the background."""
+def ingest_projects_background(
+    project_ids: list[str],
+    service: BaseIngestionService,
+    on_progress: Callable[[float, str], None] | None = None,
+):
+    """Ingests data into the system in the background.
+
+    Args:
+        project_ids (list[str]): The projects to ingest.
+        service (BaseIngestionService): The ingestion service.
+        on_progress (Callable[[float, str], None], optional): Called with the fraction of the
+            projects done and a message after each project. Defaults to None.
+
+    Raises:
+        RuntimeError: If the ingestion of any project failed, after all projects were processed.
+    """
 
     project_base_dir = settings.DATA_BASE_DIR
-    project_dirs = [project_base_dir / project_id for project_id in project_ids]
+    failed_projects = []
+
+    for i, project_id in enumerate(project_ids, start=1):
+        if not service.ingest_directory(project_base_dir / project_id):
+            failed_projects.append(project_id)
+        # A failed ingestion may still have changed part of the project
+        invalidate_project(project_id)
+
+        if on_progress is not None:
+            on_progress(i / len(project_ids), f"Ingested project {project_id}")
 
-    for project_dir in project_dirs:
-        service.ingest_directory(project_dir)
+    if failed_projects:
+        raise RuntimeError(f"Ingestion failed for projects: {failed_projects}")
 
     logger.info("Ingestion task completed. Projects ingested: %s", project_ids)
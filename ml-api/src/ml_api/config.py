@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
@@ -24,9 +25,32 @@ class Settings(BaseSettings):
     # External Service Connections
     # ==========================================================================
 
+    # HTTP connection pools shared across requests
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+
     # vLLM / TEI Configuration - Text Embedding
     TEI_URL: str = ""
     TEI_EMBEDDING_MODEL_NAME: str = "TODO"
+    TEI_MAX_BATCH_SIZE: int = 32  # Inputs per request, TEI's --max-client-batch-size
+    TEI_MAX_BATCH_TOKENS: int = (
+        16384  # Tokens per ingestion request, TEI's --max-batch-tokens
+    )
+    TEI_TOKEN_SAFETY_MARGIN: float = (
+        0.15  # Fraction of TEI_MAX_BATCH_TOKENS left free, tokens are counted with tiktoken
+    )
+    TEI_MAX_CONCURRENT_REQUESTS: int = (
+        8  # Ingestion requests in flight per pipeline worker
+    )
+    TEI_MAX_RETRIES: int = 5  # Retries of requests rejected with 429 or 503
+    TEI_RETRY_BACKOFF: float = (
+        1.0  # seconds before the first retry, doubled on each retry
+    )
+
+    # TEI - Reranker, reranking is disabled if the url is empty
+    RERANKER_URL: str = ""
+    RERANK_BATCH_SIZE: int = 32  # Texts per /rerank request
+    RERANK_TIMEOUT: float = 60  # seconds
 
     # vLLM - Text Generation
     VLLM_LLM_URL: str = ""
@@ -37,11 +61,51 @@ class Settings(BaseSettings):
     # vLLM - Vision Language Model
     VLLM_VLM_URL: str = ""
     VLLM_VLM_MODEL_NAME: str = ""
+    VLM_OCR_MAX_IN_FLIGHT: int = 16  # Concurrent OCR requests per VLM endpoint
 
     # Qdrant Vector DB
     QDRANT_URL: str = "http://localhost:6333"
     QDRANT_COLLECTION_NAME: str = "TODO"
     EMBEDDING_SIZE: int = 768
+    QDRANT_PROJECT_PARTITIONED: bool = (
+        False  # Build HNSW graphs per project_id instead of globally
+    )
+    QDRANT_HNSW_PAYLOAD_M: int = 16  # Edges per node in the per-project graphs
+    QDRANT_HNSW_M: int = 16  # Edges per node in the global graph
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_VECTORS_ON_DISK: bool = False  # Keep the original vectors on disk (mmap)
+    QDRANT_QUANTIZATION: Literal["none", "scalar", "binary"] = "none"
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True  # Keep quantized vectors in RAM
+    QDRANT_HYBRID: bool = (
+        False  # Store BM25 sparse vectors next to the dense ones, needs a new collection
+    )
+
+    # BM25 sparse vectors, see ml_api.utils.sparse
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    BM25_AVG_DOC_LENGTH: int = (
+        300  # Terms in an average chunk, normalises the chunk length
+    )
+
+    # Qdrant uploads during ingestion, see ml_api.utils.qdrant_bulk
+    QDRANT_UPLOAD_BATCH_SIZE: int = 256  # Points per upsert request
+    QDRANT_UPLOAD_PARALLEL: int = 4  # Upsert requests in flight
+    QDRANT_UPLOAD_MAX_RETRIES: int = 3
+    QDRANT_UPLOAD_WAIT: bool = (
+        False  # Wait for each upsert to be applied, otherwise only once per pipeline run
+    )
+    QDRANT_UPLOAD_BARRIER_TIMEOUT: float = (
+        300  # seconds to wait for the points of a run to be visible
+    )
+
+    # Qdrant search parameters
+    QDRANT_SEARCH_HNSW_EF: int | None = None  # None uses the collection's ef_construct
+    QDRANT_SEARCH_RESCORE: bool = (
+        True  # Rescore quantized results with the original vectors
+    )
+    QDRANT_SEARCH_OVERSAMPLING: float | None = (
+        None  # Fetch top_k * oversampling quantized candidates before rescoring
+    )
 
     # ==========================================================================
     # Model Configuration
@@ -56,10 +120,48 @@ class Settings(BaseSettings):
         2048  # parameter for the PromptHelper, space to leave in the prompt for output tokens
     )
     LLM_TEMPERATURE: float = 0.7
+    LLM_TOKENIZER: str = (
+        ""  # Hugging Face tokenizer of the LLM for prompt budgets, tiktoken with a safety margin if empty
+    )
+    LLM_TOKEN_SAFETY_MARGIN: float = (
+        0.15  # Fraction of the prompt budget left free when counting with tiktoken
+    )
+
+    # Answer synthesis, see ml_api.rag_inference.synthesis
+    RAG_SYNTHESIS_MODE: Literal["packed", "tree"] = "packed"
+    RAG_SYNTHESIS_FALLBACK: Literal["tree", "refine", "truncate"] = (
+        "tree"  # Used by "packed" when the nodes don't fit in a single prompt, "truncate" drops them
+    )
+    RAG_PROMPT_LAYOUT: Literal["default", "prefix_cache"] = (
+        "default"  # "prefix_cache" keeps prompt prefixes stable for vLLM, see ml_api.rag_inference.prompts
+    )
+    RAG_SHARED_CONTEXT: bool = (
+        False  # Answer the questions of a batch from one shared context, with the prefix cache layout
+    )
+    RAG_SYSTEM_PROMPT: str = (
+        "You are an expert Q&A system that answers questions about Global Environment Facility "
+        "(GEF) projects using only the provided context information."
+    )
 
     # Retrieval Parameters
     RETRIEVAL_TOP_K: int = 20
-    RETRIEVAL_MMR_THRESHOLD: float = 0.7
+    RETRIEVAL_RERANK_CANDIDATES: int = (
+        50  # Candidates fetched from Qdrant when reranking, RETRIEVAL_TOP_K otherwise
+    )
+    RETRIEVAL_RERANK_TOP_K: int = 8  # Nodes kept after reranking
+    RETRIEVAL_HYBRID_PREFETCH_K: int = (
+        40  # Candidates of each of the dense and BM25 searches fused with QDRANT_HYBRID
+    )
+    RETRIEVAL_FILTER_DOC_TYPES: bool = (
+        False  # Only search the document types selected by select_document_types
+    )
+
+    # Retrieval Caches
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096  # Query embeddings kept in memory (LRU)
+    RETRIEVAL_CACHE_SIZE: int = 1024  # (query, project) results kept in memory (LRU)
+    RETRIEVAL_CACHE_TTL: float = (
+        300  # seconds, also dropped when a project is re-ingested
+    )
 
     # RAG Configuration
     CHUNK_SIZE: int = 512
@@ -75,20 +177,73 @@ class Settings(BaseSettings):
     )  # then /{project_id}/{document_id}.{extension}
 
     # Processing Configuration
-    INGEST_BATCH_SIZE: int = 10
+    INGEST_BATCH_SIZE: int = 10  # Max files per pipeline run
+    INGEST_WINDOW_DOCUMENTS: int = (
+        64  # Parsed documents (e.g. pdf pages) buffered per pipeline run
+    )
+    INGEST_PREFETCH_FILES: int = 2  # Files parsed ahead while the pipeline runs
+
+    # Parsing, each file is parsed in its own process, see ml_api.ingestion.parsing
+    PARSER_TIMEOUT: float = 300  # seconds per file, the parser is killed after
+    PARSER_MAX_MEMORY: int = (
+        4 * 1024**3  # address space of a parser process in bytes, 0 for no limit
+    )
+
+    # Table Extraction, DOCX tables are ingested as separate markdown nodes, see ml_api.ingestion.tables
+    DOCX_TABLE_EXTRACTION: bool = True
+
+    # Ingestion Manifest, records ingested files so unchanged files are skipped on re-ingestion
+    INGESTION_MANIFEST_PATH: str = ""  # Manifest is disabled if empty
 
     # PDF Processing
-    PDF_2_PNG_DPI: int = 300
+    PDF_2_PNG_DPI: int = 300  # Max render DPI, lowered to fit VLM_IMAGE_MAX_PIXELS
+
+    # VLM Page Images
+    VLM_IMAGE_FORMAT: str = "PNG"  # PNG, JPEG or WEBP
+    VLM_IMAGE_QUALITY: int = 90  # Only used by lossy formats
+    VLM_IMAGE_MAX_PIXELS: int = 1280 * 28 * 28  # Qwen2.5-VL max_pixels, 0 to disable
+
+    # Hybrid Ingestion, pages whose text layer fails any of these checks are OCR'd
+    HYBRID_MIN_PAGE_CHARS: int = 200
+    HYBRID_MAX_GARBAGE_RATIO: float = 0.05
+    HYBRID_MAX_TABLE_DENSITY: float = 0.6
+
+    # OCR Cache, stores VLM OCR results keyed by page image, model and prompt
+    OCR_CACHE_PATH: str = ""  # Cache is disabled if empty
+    OCR_CACHE_MAX_BYTES: int = 2 * 1024**3  # 2 GiB of OCR text
+
+    # Embedding Cache, stores chunk embeddings keyed by chunk text and embedding model
+    EMBEDDING_CACHE_PATH: str = ""  # Cache is disabled if empty
+    EMBEDDING_CACHE_MAX_BYTES: int = 8 * 1024**3  # 8 GiB of float32 embeddings
 
     # Single File Processing
     READER_NUM_WORKERS_SINGLE: int = 4
     PIPELINE_NUM_WORKERS_SINGLE: int = 1
-    PIPELINE_PERSIST: bool = False
-    PIPELINE_PERSIST_PATH: str = ""  # Only used if PIPELINE_PERSIST is True
 
     # Multi-File Processing
     READER_NUM_WORKERS_BATCH: int = 4
-    PIPELINE_NUM_WORKERS_BATCH: int = 4
+    PIPELINE_NUM_WORKERS_BATCH: int = (
+        1  # Each worker process sends TEI_MAX_CONCURRENT_REQUESTS embedding requests
+    )
+
+    # ==========================================================================
+    # Background Jobs, see ml_api.jobs
+    # ==========================================================================
+
+    JOB_QUEUE_PATH: str = ""  # Jobs run in-process as BackgroundTasks if empty
+    JOB_WORKER_PROCESSES: int = 2  # Worker processes running jobs of any kind
+    JOB_RAG_WORKER_PROCESSES: int = (
+        1  # Extra worker processes reserved for RAG jobs, free while ingestion runs
+    )
+    JOB_POLL_INTERVAL: float = 1.0  # Seconds between polls of an idle worker
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = (
+        30.0  # Seconds before the first retry, doubled on each retry
+    )
+    JOB_HEARTBEAT_INTERVAL: float = 30.0
+    JOB_STALE_TIMEOUT: float = (
+        300.0  # Running jobs without a heartbeat for this long are requeued
+    )
 
 
 settings = Settings()
@@ -1,3 +1,4 @@
 from .vlm import VLMIngestionService
 from .naive import NaiveIngestionService
+from .hybrid import HybridIngestionService
 from .base import BaseIngestionService
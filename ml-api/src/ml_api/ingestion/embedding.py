@@ -0,0 +1,246 @@
+"""
+Batched, concurrent embedding stage of the ingestion pipeline.
+
+The embedding model as a pipeline transformation sends one TEI request per embed_batch_size nodes,
+one at a time, so a TEI pod is either underused or, with pipeline worker processes each sending
+their own requests, overloaded. TEIEmbeddingTransform groups the nodes into batches bounded by
+TEI_MAX_BATCH_SIZE inputs and TEI_MAX_BATCH_TOKENS tokens (TEI's --max-client-batch-size and
+--max-batch-tokens), keeps TEI_MAX_CONCURRENT_REQUESTS requests in flight and retries the
+requests TEI rejects:
+
+- 413: the batch is too large, it is split in half and both halves are sent again.
+
+Tokens are counted with tiktoken, not the embedding model's tokenizer, so TEI_TOKEN_SAFETY_MARGIN
+of the batch token budget is left free to keep 413s rare.
+- 429 and 503: TEI is overloaded, the request is retried after a backoff.
+
+Identical texts are only embedded once per run, and with EMBEDDING_CACHE_PATH chunks embedded by
+earlier runs are not sent to TEI at all (see ml_api.ingestion.embedding_cache).
+
+Ingestion runs in worker threads without an event loop, where asyncio_run would create a new loop,
+and with it a new TEI client and connection pool, for every pipeline window. Synchronous calls
+run on one event loop per process instead, in a background thread, so the client is reused.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Sequence
+
+import httpx
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.schema import BaseNode, MetadataMode, TransformComponent
+from llama_index.core.utils import get_tokenizer
+from llama_index.utils.huggingface import format_text
+from ml_api.config import settings
+from ml_api.utils.embeddings import PooledTextEmbeddingsInference
+
+from .embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = (429, 503)
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_pid: int | None = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """The event loop of the synchronous embedding stage, running for the lifetime of the process."""
+    global _loop, _loop_pid
+
+    with _loop_lock:
+        # A forked pipeline worker inherits the loop but not its thread
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(
+                target=_loop.run_forever, name="tei-embedding-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def token_budget_batches(
+    token_counts: list[int], max_batch_size: int, max_batch_tokens: int
+) -> list[list[int]]:
+    """Group texts, in order, into batches of at most max_batch_size texts and max_batch_tokens tokens.
+
+    A text longer than max_batch_tokens gets a batch of its own, TEI truncates it.
+
+    Returns:
+        list[list[int]]: The indices of the texts of each batch.
+    """
+    batches: list[list[int]] = []
+    batch: list[int] = []
+    batch_tokens = 0
+
+    for i, tokens in enumerate(token_counts):
+        if batch and (
+            len(batch) >= max_batch_size or batch_tokens + tokens > max_batch_tokens
+        ):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(i)
+        batch_tokens += tokens
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class TEIEmbeddingTransform(TransformComponent):
+    """Embeds nodes with TEI in token-budgeted batches, with concurrent requests and retries."""
+
+    embed_model: PooledTextEmbeddingsInference = Field(
+        description="The TEI embedding model."
+    )
+    max_batch_size: int = Field(default=settings.TEI_MAX_BATCH_SIZE)
+    max_batch_tokens: int = Field(default=settings.TEI_MAX_BATCH_TOKENS)
+    token_safety_margin: float = Field(default=settings.TEI_TOKEN_SAFETY_MARGIN)
+    max_concurrent_requests: int = Field(default=settings.TEI_MAX_CONCURRENT_REQUESTS)
+    max_retries: int = Field(default=settings.TEI_MAX_RETRIES)
+    retry_backoff: float = Field(default=settings.TEI_RETRY_BACKOFF)
+    cache_path: str = Field(
+        default=settings.EMBEDDING_CACHE_PATH,
+        description="The embedding cache database, the cache is disabled if empty.",
+    )
+
+    _tokenizer: Callable[[str], list] | None = PrivateAttr(default=None)
+    _cache: EmbeddingCache | None = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TEIEmbeddingTransform"
+
+    def __getstate__(self) -> dict[Any, Any]:
+        # The tokenizer and cache connection aren't picklable, pipeline worker processes open their own
+        state = super().__getstate__()
+        state["__pydantic_private__"] = {
+            **state["__pydantic_private__"],
+            "_tokenizer": None,
+            "_cache": None,
+        }
+        return state
+
+    def _get_cache(self) -> EmbeddingCache | None:
+        if self._cache is None and self.cache_path:
+            self._cache = EmbeddingCache(self.cache_path)
+        return self._cache
+
+    def _count_tokens(self, text: str) -> int:
+        # An approximation, the embedding model's tokenizer is only known to TEI
+        if self._tokenizer is None:
+            self._tokenizer = get_tokenizer()
+        return len(self._tokenizer(text))
+
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any) -> Sequence[BaseNode]:
+        return asyncio.run_coroutine_threadsafe(
+            self.acall(nodes, **kwargs), _get_loop()
+        ).result()
+
+    async def acall(
+        self, nodes: Sequence[BaseNode], **kwargs: Any
+    ) -> Sequence[BaseNode]:
+        if not nodes:
+            return nodes
+
+        texts = [
+            format_text(
+                node.get_content(metadata_mode=MetadataMode.EMBED),
+                self.embed_model.model_name,
+                self.embed_model.text_instruction,
+            )
+            for node in nodes
+        ]
+        keys = [
+            EmbeddingCache.make_key(text, self.embed_model.model_name) for text in texts
+        ]
+
+        cache = self._get_cache()
+        embeddings = cache.get_many(keys) if cache is not None else {}
+        cached = len(embeddings)
+
+        # Each distinct text that isn't cached is embedded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in embeddings}
+        missing_keys = list(missing)
+        missing_texts = list(missing.values())
+
+        batches = token_budget_batches(
+            [self._count_tokens(text) for text in missing_texts],
+            self.max_batch_size,
+            int(self.max_batch_tokens * (1 - self.token_safety_margin)),
+        )
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        stats = {"requests": 0, "retries": 0}
+        new_embeddings: dict[str, list[float]] = {}
+        started = time.perf_counter()
+
+        async def _embed_batch(batch: list[int]):
+            batch_embeddings = await self._embed(
+                [missing_texts[i] for i in batch], semaphore, stats
+            )
+            for i, embedding in zip(batch, batch_embeddings):
+                new_embeddings[missing_keys[i]] = embedding
+
+        await asyncio.gather(*[_embed_batch(batch) for batch in batches])
+        elapsed = time.perf_counter() - started
+
+        if cache is not None and new_embeddings:
+            cache.put_many(new_embeddings)
+        embeddings.update(new_embeddings)
+
+        for node, key in zip(nodes, keys):
+            node.embedding = embeddings[key]
+
+        logger.info(
+            f"Embedded {len(new_embeddings)} of {len(nodes)} nodes in {elapsed:.2f} seconds "
+            f"({len(new_embeddings) / max(elapsed, 1e-9):.1f} embeddings/s, "
+            f"{stats['requests']} requests, {stats['retries']} retries, {cached} cached, "
+            f"{len(nodes) - cached - len(new_embeddings)} duplicates)"
+        )
+        return nodes
+
+    async def _embed(
+        self, texts: list[str], semaphore: asyncio.Semaphore, stats: dict[str, int]
+    ) -> list[list[float]]:
+        """Embed a batch, splitting it if TEI rejects it as too large."""
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    stats["requests"] += 1
+                    return await self.embed_model._acall_api(texts)
+            except httpx.HTTPStatusError as e:
+                status_code = e.response.status_code
+
+                if status_code == 413 and len(texts) > 1:
+                    middle = len(texts) // 2
+                    logger.warning(
+                        f"TEI rejected a batch of {len(texts)} texts as too large, splitting it"
+                    )
+                    halves = await asyncio.gather(
+                        self._embed(texts[:middle], semaphore, stats),
+                        self._embed(texts[middle:], semaphore, stats),
+                    )
+                    return halves[0] + halves[1]
+
+                if status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    raise
+
+                retry_after = e.response.headers.get("Retry-After", "")
+                delay = (
+                    float(retry_after)
+                    if retry_after.isdigit()
+                    else self.retry_backoff * 2**attempt
+                )
+                logger.warning(
+                    f"TEI responded {status_code}, retrying in {delay:.1f} seconds"
+                )
+                attempt += 1
+                stats["retries"] += 1
+                await asyncio.sleep(delay)
@@ -0,0 +1,159 @@
+"""
+Persistent cache of chunk embeddings.
+
+GEF documents share a lot of template text, so the same chunks are embedded again and again, and
+re-ingesting a project (e.g. after a parsing change) re-embeds chunks that did not change. Chunk
+embeddings are stored in SQLite keyed by a hash of the text and the embedding model, so the
+pipeline's embedding stage (see ml_api.ingestion.embedding) only sends unseen chunks to TEI. The
+cache is shared by all ingestion services.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from ml_api.config import settings
+from ml_api.utils.sqlite import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+EVICTION_TARGET_RATIO = 0.9  # evict down to this fraction of max_bytes
+SQLITE_MAX_VARIABLES = 900  # keys per SELECT, below SQLite's bound parameter limit
+
+
+def _to_blob(embedding: list[float]) -> bytes:
+    return array("f", embedding).tobytes()
+
+
+def _from_blob(blob: bytes) -> list[float]:
+    return array("f", blob).tolist()
+
+
+class EmbeddingCache:
+    """SQLite backed embedding cache with least-recently-used eviction by total size.
+
+    Embeddings are stored as float32, which is also the precision Qdrant stores them in.
+    """
+
+    def __init__(
+        self, db_path: Path | str, max_bytes: int = settings.EMBEDDING_CACHE_MAX_BYTES
+    ):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = connect_sqlite(self.db_path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+        )
+        self._connection.commit()
+
+        self._size_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, model_name: str) -> str:
+        """Build the cache key of a chunk text for a given embedding model."""
+        digest = hashlib.sha256()
+        for part in (text, model_name):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Get the cached embeddings of the keys, missing keys are left out."""
+        found: dict[str, list[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            for i in range(0, len(unique_keys), SQLITE_MAX_VARIABLES):
+                chunk = unique_keys[i : i + SQLITE_MAX_VARIABLES]
+                rows = self._connection.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for key, blob in rows:
+                    found[key] = _from_blob(blob)
+
+            now = time.time()
+            self._connection.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self._connection.commit()
+
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+
+        return found
+
+    def put_many(self, embeddings: dict[str, list[float]]):
+        """Store embeddings, evicting the least recently used ones if the cache is full."""
+        now = time.time()
+        rows = [
+            (key, _to_blob(embedding), now) for key, embedding in embeddings.items()
+        ]
+
+        with self._lock:
+            for row in rows:
+                # Other processes may have stored the key already
+                inserted = self._connection.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, embedding, last_access) VALUES (?, ?, ?)",
+                    row,
+                ).rowcount
+                self._size_bytes += len(row[1]) * inserted
+
+            if self._size_bytes > self.max_bytes:
+                self._evict()
+
+            self._connection.commit()
+
+    def _evict(self):
+        """Delete the least recently used embeddings until the cache is below its eviction target."""
+        target = self.max_bytes * EVICTION_TARGET_RATIO
+
+        rows = self._connection.execute(
+            "SELECT key, LENGTH(embedding) FROM embeddings ORDER BY last_access ASC"
+        )
+        keys_to_evict = []
+        for key, size in rows:
+            if self._size_bytes <= target:
+                break
+            keys_to_evict.append((key,))
+            self._size_bytes -= size
+
+        self._connection.executemany(
+            "DELETE FROM embeddings WHERE key = ?", keys_to_evict
+        )
+        logger.info(
+            f"Evicted {len(keys_to_evict)} embeddings from the embedding cache."
+        )
+
+    def stats(self) -> dict[str, int | float]:
+        """Get the hit/miss counters and size of the cache."""
+        with self._lock:
+            entries = self._connection.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": self._size_bytes,
+        }
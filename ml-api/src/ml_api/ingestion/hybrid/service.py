@@ -0,0 +1,164 @@
+"""
+This service ingests documents using their embedded text layer where it is usable, and VLM OCR where it is not.
+
+Each PDF page's text layer is extracted and scored (character count, garbage ratio, table density).
+Only scanned or low-quality pages are rendered and sent to the VLM, which keeps quality on scanned
+review sheets while cutting GPU OCR volume for born-digital documents. Non-PDF files are read as
+in the naive service.
+"""
+
+import logging
+from pathlib import Path
+
+from llama_index.core.readers import SimpleDirectoryReader
+from llama_index.core.schema import Document
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
+from ml_api.config import settings
+from ml_api.utils.clients import get_clients
+
+from ..base import BaseIngestionService
+from ..naive.metadata import file_metadata
+from ..pipeline import get_pipeline
+from ..vlm.ocr_cache import OCRCache
+from ..vlm.rolmocr_utils import iter_pdf_base64_images, ocr_images
+from .text_layer import iter_text_layer_pages
+
+logger = logging.getLogger(__name__)
+
+
+class HybridIngestionService(BaseIngestionService):
+    def __init__(
+        self,
+        vector_store: BasePydanticVectorStore | None = None,
+        ocr_cache: OCRCache | None = None,
+    ):
+        super().__init__()
+
+        if not settings.VLLM_VLM_URL:
+            raise ValueError("VLLM_VLM_URL is not set in the environment variables.")
+
+        self.vector_store = (
+            get_clients().vector_store if vector_store is None else vector_store
+        )
+
+        self.oai_client_vlm = get_clients().vlm_client
+
+        if ocr_cache is None and settings.OCR_CACHE_PATH:
+            ocr_cache = OCRCache(settings.OCR_CACHE_PATH)
+        self.ocr_cache = ocr_cache
+
+        self._pipeline = get_pipeline()
+
+    def ingest_file(self, file: Path) -> bool:
+        """Ingest a specific file into the qdrant database, OCR'ing only the pages that need it.
+
+        Args:
+            file (Path): the path to the file to ingest
+
+        Returns:
+            bool: True if ingestion was successful, False otherwise
+        """
+        try:
+            if file.suffix.lower() == ".pdf":
+                documents = self._get_parsed_documents_from_pdf(file)
+            else:
+                reader = SimpleDirectoryReader(
+                    input_files=[file], file_metadata=file_metadata
+                )
+                documents = reader.load_data()
+
+            if not documents:
+                logger.warning(f"No documents parsed from file: {file}")
+                return False
+
+            processed_nodes = self._pipeline.run(
+                show_progress=True,
+                documents=documents,
+                num_workers=settings.PIPELINE_NUM_WORKERS_SINGLE,
+            )
+
+            logger.info(
+                f"Processed & ingested {len(processed_nodes)} nodes from {file}"
+            )
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to ingest file {file}: {e}")
+            logger.exception("Exception occurred during file ingestion")
+
+        return False
+
+    def ingest_directory(self, directory: Path) -> bool:
+        """Ingest all files in a directory and its subdirectories.
+
+        A file that fails to ingest is logged and skipped, the remaining files are still ingested.
+
+        Args:
+            directory (Path): the path to the directory to ingest
+
+        Returns:
+            bool: True if all files were ingested successfully, False otherwise
+        """
+        success = True
+        for file in directory.glob("**/*"):
+            if file.is_file() and not self.ingest_file(file):
+                logger.error(f"Failed to ingest file: {file}")
+                success = False
+
+        logger.info(f"Ingestion completed for directory: {directory}")
+
+        return success
+
+    def _get_parsed_documents_from_pdf(self, file: Path) -> list[Document]:
+        """
+        Parse a PDF into one LlamaIndex document per page, from the text layer or OCR.
+
+        Args:
+            file (Path): The path to the PDF.
+
+        Returns:
+            list[Document]: The documents of the non-empty pages, in page order.
+        """
+        page_texts: dict[int, str] = {}
+        page_text_sources: dict[int, str] = {}
+        ocr_page_numbers: list[int] = []
+
+        for page in iter_text_layer_pages(file):
+            if page.score.needs_ocr():
+                logger.debug(f"Page {page.page_number} needs OCR: {page.score}")
+                ocr_page_numbers.append(page.page_number)
+            else:
+                page_texts[page.page_number] = page.text
+                page_text_sources[page.page_number] = "text_layer"
+
+        num_pages = len(page_texts) + len(ocr_page_numbers)
+        logger.info(
+            f"{len(ocr_page_numbers)}/{num_pages} pages of {file} need OCR, using the text layer for the rest."
+        )
+
+        if ocr_page_numbers:
+            images = iter_pdf_base64_images(file, page_numbers=ocr_page_numbers)
+            ocr_texts = ocr_images(images, self.oai_client_vlm, cache=self.ocr_cache)
+
+            for page_number, text in zip(ocr_page_numbers, ocr_texts):
+                if text is None or text.strip() == "":
+                    logger.warning(f"OCR returned no text for page {page_number}.")
+                    continue
+
+                page_texts[page_number] = text
+                page_text_sources[page_number] = "ocr"
+
+        base_metadata = file_metadata(str(file))
+
+        return [
+            Document(
+                text=page_texts[page_number],
+                metadata={
+                    **base_metadata,
+                    "page_number": page_number,
+                    "text_source": page_text_sources[page_number],
+                },
+            )
+            for page_number in sorted(page_texts)
+            if page_texts[page_number].strip()
+        ]
@@ -0,0 +1,107 @@
+"""
+Extraction and quality scoring of the embedded text layer of PDF pages.
+
+Pages with a usable text layer are ingested as is, the rest (scanned pages, broken encodings,
+table-heavy pages whose text comes out shredded) are sent to the VLM for OCR.
+"""
+
+import logging
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from ml_api.config import settings
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+CID_MARKER = "(cid:"  # pdf fonts without a unicode mapping are extracted as (cid:123)
+
+
+@dataclass
+class TextLayerScore:
+    char_count: int
+    garbage_ratio: float  # share of characters that are unreadable
+    table_density: float  # share of lines that look like flattened table cells
+
+    def needs_ocr(
+        self,
+        min_chars: int = settings.HYBRID_MIN_PAGE_CHARS,
+        max_garbage_ratio: float = settings.HYBRID_MAX_GARBAGE_RATIO,
+        max_table_density: float = settings.HYBRID_MAX_TABLE_DENSITY,
+    ) -> bool:
+        """Whether the text layer is too poor to use and the page should be OCR'd instead."""
+        return (
+            self.char_count < min_chars
+            or self.garbage_ratio > max_garbage_ratio
+            or self.table_density > max_table_density
+        )
+
+
+@dataclass
+class TextLayerPage:
+    page_number: int
+    text: str
+    score: TextLayerScore
+
+
+def score_text_layer(text: str) -> TextLayerScore:
+    """
+    Score the quality of a page's extracted text.
+
+    Args:
+        text (str): The text extracted from the page's text layer.
+
+    Returns:
+        TextLayerScore: The character count, garbage ratio and table density of the text.
+    """
+    chars = [char for char in text if not char.isspace()]
+    if not chars:
+        return TextLayerScore(char_count=0, garbage_ratio=0.0, table_density=0.0)
+
+    garbage = sum(1 for char in chars if _is_garbage_char(char))
+    garbage += text.count(CID_MARKER) * len(CID_MARKER)
+
+    lines = [line.split() for line in text.splitlines() if line.strip()]
+    # Tables are flattened to one short line per cell, prose lines hold many words
+    short_lines = sum(1 for tokens in lines if len(tokens) <= 2)
+
+    return TextLayerScore(
+        char_count=len(chars),
+        garbage_ratio=min(1.0, garbage / len(chars)),
+        table_density=short_lines / len(lines) if lines else 0.0,
+    )
+
+
+def _is_garbage_char(char: str) -> bool:
+    if char == "\ufffd":  # unicode replacement character
+        return True
+    # Control characters, unassigned code points and private use glyphs
+    return unicodedata.category(char) in ("Cc", "Cn", "Co", "Cs")
+
+
+def iter_text_layer_pages(pdf_path: Path) -> Iterator[TextLayerPage]:
+    """
+    Extract and score the text layer of each page of a PDF, one page at a time.
+
+    Args:
+        pdf_path (Path): The path to the PDF document.
+
+    Yields:
+        TextLayerPage: The page number, text and score of each page, in page order.
+    """
+    reader = PdfReader(pdf_path)
+
+    for page_number, page in enumerate(reader.pages, start=1):
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            logger.warning(
+                f"Failed to extract the text layer of page {page_number} of {pdf_path}: {e}"
+            )
+            text = ""
+
+        yield TextLayerPage(
+            page_number=page_number, text=text, score=score_text_layer(text)
+        )
@@ -0,0 +1,198 @@
+"""
+Persistent record of which files have been ingested into the vector store.
+
+For every ingested file the manifest stores its size, mtime, content hash and the IDs
+of the nodes that were written to Qdrant. This lets a re-ingestion skip unchanged files
+with a single stat call, and delete the stale points of files that changed or were removed.
+Files that could not be parsed are recorded with their error until they are ingested.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+
+from ml_api.utils.sqlite import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+HASH_READ_SIZE = 1024 * 1024  # 1 MiB
+
+
+class FileState(str, Enum):
+    NEW = "new"
+    CHANGED = "changed"
+    UNCHANGED = "unchanged"
+
+
+@dataclass
+class ManifestEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    node_ids: list[str] = field(default_factory=list)
+
+
+def hash_file(file: Path) -> str:
+    """Compute the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        while chunk := f.read(HASH_READ_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """SQLite backed manifest of ingested files, keyed by absolute file path."""
+
+    def __init__(self, db_path: Path | str):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._connection = connect_sqlite(self.db_path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS ingested_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                node_ids TEXT NOT NULL
+            )
+            """)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS failed_files (
+                path TEXT PRIMARY KEY,
+                error TEXT NOT NULL,
+                failed_at REAL NOT NULL
+            )
+            """)
+        self._connection.commit()
+
+    def get(self, file: Path) -> ManifestEntry | None:
+        """Get the manifest entry for a file, or None if it was never ingested."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT path, size, mtime_ns, content_hash, node_ids FROM ingested_files WHERE path = ?",
+                (str(file.resolve()),),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return ManifestEntry(
+            path=row[0],
+            size=row[1],
+            mtime_ns=row[2],
+            content_hash=row[3],
+            node_ids=json.loads(row[4]),
+        )
+
+    def entries_under(self, directory: Path) -> list[ManifestEntry]:
+        """Get all manifest entries for files located under a directory."""
+        prefix = str(directory.resolve()).rstrip("/") + "/"
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, size, mtime_ns, content_hash, node_ids FROM ingested_files WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+
+        return [
+            ManifestEntry(
+                path=row[0],
+                size=row[1],
+                mtime_ns=row[2],
+                content_hash=row[3],
+                node_ids=json.loads(row[4]),
+            )
+            for row in rows
+        ]
+
+    def record(self, file: Path, node_ids: list[str], content_hash: str | None = None):
+        """Record that a file was ingested and which nodes were written for it.
+
+        Args:
+            file (Path): The ingested file.
+            node_ids (list[str]): The IDs of the nodes written to the vector store.
+            content_hash (str | None, optional): The content hash, if already computed.
+        """
+        stat = file.stat()
+        if content_hash is None:
+            content_hash = hash_file(file)
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO ingested_files (path, size, mtime_ns, content_hash, node_ids) VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(file.resolve()),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    content_hash,
+                    json.dumps(node_ids),
+                ),
+            )
+            self._connection.execute(
+                "DELETE FROM failed_files WHERE path = ?", (str(file.resolve()),)
+            )
+            self._connection.commit()
+
+    def record_failure(self, file: Path, error: str):
+        """Record that a file could not be ingested, e.g. because its parser timed out."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO failed_files (path, error, failed_at) VALUES (?, ?, ?)",
+                (str(file.resolve()), error, time.time()),
+            )
+            self._connection.commit()
+
+    def failures_under(self, directory: Path) -> dict[str, str]:
+        """Get the errors of the files under a directory that could not be ingested, by path."""
+        prefix = str(directory.resolve()).rstrip("/") + "/"
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, error FROM failed_files WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+
+        return dict(rows)
+
+    def remove(self, path: str):
+        """Remove the entry for a file path."""
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM ingested_files WHERE path = ?", (path,)
+            )
+            self._connection.execute("DELETE FROM failed_files WHERE path = ?", (path,))
+            self._connection.commit()
+
+    def check(self, file: Path) -> tuple[FileState, ManifestEntry | None]:
+        """Compare a file on disk against its manifest entry.
+
+        Unchanged size and mtime are trusted without reading the file. If either differs the
+        content hash is compared, and a file whose content is identical has its stat refreshed
+        so the next check is cheap again.
+
+        Args:
+            file (Path): The file to check.
+
+        Returns:
+            tuple[FileState, ManifestEntry | None]: The state of the file and its previous entry.
+        """
+        entry = self.get(file)
+        if entry is None:
+            return FileState.NEW, None
+
+        stat = file.stat()
+        if stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns:
+            return FileState.UNCHANGED, entry
+
+        content_hash = hash_file(file)
+        if content_hash == entry.content_hash:
+            logger.debug("File %s was touched but its content is unchanged.", file)
+            self.record(file, entry.node_ids, content_hash=content_hash)
+            return FileState.UNCHANGED, entry
+
+        return FileState.CHANGED, entry
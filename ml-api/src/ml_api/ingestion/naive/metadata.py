@@ -1,6 +1,6 @@
 import logging
 import os
-from .gef_documents import identify_document_type
+from .gef_documents import extract_and_identify_filename
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +13,8 @@ def file_metadata(filename: str) -> dict[str, str]:
     base_name = os.path.basename(filename)
     project_id, doc_id = parse_filename(base_name)
 
-    doc_type = identify_document_type(base_name)
+    # Stored files are prefixed with p<project>_doc<n>__, the patterns match the original name
+    doc_type = extract_and_identify_filename(base_name)
 
     return {
         "filename": base_name,
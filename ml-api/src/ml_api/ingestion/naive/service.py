@@ -6,16 +6,25 @@ and indexing the chunks into the Qdrant database to be used in inference.
 """
 
 import logging
+from itertools import islice
 from pathlib import Path
-
-from llama_index.core.readers import SimpleDirectoryReader
-from llama_index.core.vector_stores.types import BasePydanticVectorStore
+from typing import Iterable, Iterator
+
+from llama_index.core.schema import BaseNode, Document
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilter,
+    MetadataFilters,
+)
 from ml_api.config import settings
-from ml_api.utils.qdrant import get_qdrant_vector_store
+from ml_api.utils.clients import get_clients
 
 from ..base import BaseIngestionService
-from .metadata import file_metadata
+from ..manifest import FileState, IngestionManifest
+from ..parsing import ParseResult, parse_files
 from ..pipeline import get_pipeline
+from ..streaming import prefetch, window_by_size
+from .metadata import file_metadata
 
 logger = logging.getLogger(__name__)
 
@@ -23,11 +32,19 @@ logger = logging.getLogger(__name__)
 class NaiveIngestionService(BaseIngestionService):
     """Service to ingest data into the Qdrant database and manage state."""
 
-    def __init__(self, vector_store: BasePydanticVectorStore | None = None):
+    def __init__(
+        self,
+        vector_store: BasePydanticVectorStore | None = None,
+        manifest: IngestionManifest | None = None,
+    ):
         self.vector_store = (
-            get_qdrant_vector_store() if vector_store is None else vector_store
+            get_clients().vector_store if vector_store is None else vector_store
         )
 
+        if manifest is None and settings.INGESTION_MANIFEST_PATH:
+            manifest = IngestionManifest(settings.INGESTION_MANIFEST_PATH)
+        self.manifest = manifest
+
         self._pipeline = get_pipeline()
 
     def ingest_file(self, file: Path) -> bool:
@@ -39,21 +56,20 @@ class NaiveIngestionService(BaseIngestionService):
 
         try:
             # Try to ingest the file
-            reader = SimpleDirectoryReader(
-                input_files=[file], file_metadata=file_metadata
-            )
+            result = next(parse_files([file], num_workers=1))
+            if not result.ok:
+                self._record_failed_files([result])
+                return False
 
-            docs = reader.load_data(num_workers=settings.READER_NUM_WORKERS_SINGLE)
+            docs = result.documents
             logger.info(f"Loaded {len(docs)} documents from {file}")
 
-            # Pipeline includes embeddings and vector db, so this is all we need to run
-            processed_nodes = self._pipeline.run(
+            processed_nodes = self._replace_files(
+                [file],
+                docs,
                 show_progress=True,
-                documents=docs,
                 num_workers=settings.PIPELINE_NUM_WORKERS_SINGLE,
             )
-            if settings.PIPELINE_PERSIST:
-                self._pipeline.persist(persist_dir=settings.PIPELINE_PERSIST_PATH)
 
             logger.info(
                 f"Processed & ingested {len(processed_nodes)} nodes from {file}"
@@ -68,77 +84,284 @@ class NaiveIngestionService(BaseIngestionService):
         """
         Ingests a group of files into the vector database. Expects a pre-batched list of file paths.
 
+        Each file is parsed in its own process (see ml_api.ingestion.parsing), files that fail to
+        parse are recorded in the manifest and the others are still ingested.
+
         Args:
             file_paths (list[Path]): A list of file paths to be ingested.
 
+        Returns:
+            bool: True if all files were ingested, False otherwise.
+
         Raises:
             Exception: If any error occurs during the ingestion process, it will be logged.
         """
         try:
-            reader = SimpleDirectoryReader(
-                input_files=file_batch, file_metadata=file_metadata
-            )
+            results = list(parse_files(file_batch))
+            failed = [result for result in results if not result.ok]
+            self._record_failed_files(failed)
 
-            docs = reader.load_data(num_workers=settings.READER_NUM_WORKERS_BATCH)
-            logger.info(f"Loaded {len(docs)} documents from {len(file_batch)} files.")
+            files = [result.file for result in results if result.ok]
+            if not files:
+                return False
 
-            processed_nodes = self._pipeline.run(
+            docs = [doc for result in results for doc in result.documents]
+            logger.info(
+                f"Loaded {len(docs)} documents from {len(files)} files, {len(failed)} files failed."
+            )
+
+            processed_nodes = self._replace_files(
+                files,
+                docs,
                 show_progress=True,
-                documents=docs,
                 num_workers=settings.PIPELINE_NUM_WORKERS_BATCH,
             )
             logger.info(
-                f"Processed & ingested {len(processed_nodes)} nodes from {len(file_batch)} files."
+                f"Processed & ingested {len(processed_nodes)} nodes from {len(files)} files."
             )
 
         except Exception as e:
             logger.error(f"Batch ingestion failed: {e}", exc_info=True)
             return False
 
-        return True
+        return not failed
 
     def generate_file_batches(
-        self, files: list[Path], batch_size: int = settings.INGEST_BATCH_SIZE
-    ):
+        self, files: Iterable[Path], batch_size: int = settings.INGEST_BATCH_SIZE
+    ) -> Iterator[list[Path]]:
         """Batch files into groups of a certain size.
 
         Args:
-            files (list[Path]): The list of files to be batched.
+            files (Iterable[Path]): The files to be batched, consumed lazily.
             batch_size (int, optional): The size of each batch. Defaults to settings.INGEST_BATCH_SIZE.
 
         Yields:
             list[Path]: A batch of files.
         """
-        for i in range(0, len(files), batch_size):
-            yield files[i : i + batch_size]
+        files = iter(files)
+        while batch := list(islice(files, batch_size)):
+            yield batch
 
     def ingest_directory(self, directory: Path = settings.DATA_BASE_DIR) -> bool:
         """Ingest all files in a directory.
 
-        This method will enumerate all files in the given directory and its subdirectories,
-        and ingest them in batches.
+        This method streams the files in the given directory and its subdirectories through
+        walk -> read -> split -> embed -> upsert stages. Files are parsed ahead in parser processes
+        (up to settings.INGEST_PREFETCH_FILES results are buffered), and parsed documents are run
+        through the pipeline in windows of about settings.INGEST_WINDOW_DOCUMENTS documents, so
+        memory stays flat regardless of the number of files.
 
-        TODO: Make this check the database for existing files and only ingest new ones.
-        """
+        If an ingestion manifest is configured, files that have not changed since they were last
+        ingested are skipped, and the points of files that were changed or removed are deleted
+        from the vector store.
 
-        all_files = list(
-            directory.glob("**/*")
-        )  # Gives all files in the directory and subdirectories
+        Returns:
+            bool: True if all windows were ingested, False if there were no files or a window
+                failed. Files that could not be parsed are skipped and don't fail the
+                ingestion, as retrying won't parse them either.
+        """
 
-        if not all_files:
+        if not any(file.is_file() for file in directory.glob("**/*")):
             logger.warning(
                 f"No files found in directory {directory}, aborting ingestion."
             )
             return False
 
-        batches = list(self.generate_file_batches(all_files))
+        if self.manifest is not None:
+            self._prune_removed_files(directory)
+
+        file_documents = prefetch(
+            self.iter_file_documents(self.iter_files_to_ingest(directory)),
+            max_in_flight=settings.INGEST_PREFETCH_FILES,
+        )
+        windows = window_by_size(
+            file_documents,
+            max_size=settings.INGEST_WINDOW_DOCUMENTS,
+            size_fn=lambda file_docs: len(file_docs[1]),
+            max_items=settings.INGEST_BATCH_SIZE,
+        )
 
         num_processed_files = 0
-        for i, batch in enumerate(batches):
-            self.ingest_file_batch(batch)
-            num_processed_files += len(batch)
+        success = True
+        for i, window in enumerate(windows):
+            # A failed window is logged, the remaining windows are still ingested
+            if not self._ingest_window(window):
+                success = False
+            num_processed_files += len(window)
             logger.info(
-                f"Progress: Batch #{i} | {num_processed_files}/{len(all_files)} files processed."
+                f"Progress: Window #{i} | {num_processed_files} files processed."
             )
 
+        if num_processed_files == 0:
+            logger.info(f"All files in {directory} are already ingested.")
+
+        if self.manifest is not None:
+            failures = self.manifest.failures_under(directory)
+            if failures:
+                logger.warning(
+                    f"{len(failures)} files in {directory} could not be parsed: {failures}"
+                )
+
+        return success
+
+    def iter_files_to_ingest(self, directory: Path) -> Iterator[Path]:
+        """Walk a directory and yield the files that need to be ingested.
+
+        Without a manifest this is every file, with a manifest unchanged files are skipped.
+        """
+        for file in directory.glob("**/*"):
+            if not file.is_file():
+                continue
+
+            if self.manifest is not None:
+                state, _ = self.manifest.check(file)
+                if state == FileState.UNCHANGED:
+                    logger.debug(f"Skipping unchanged file {file}")
+                    continue
+
+            yield file
+
+    def iter_file_documents(
+        self, files: Iterable[Path]
+    ) -> Iterator[tuple[Path, list[Document]]]:
+        """Parse files in parallel, yielding each file with its parsed documents.
+
+        Files that fail to parse are recorded in the manifest and skipped.
+        """
+        for result in parse_files(files):
+            if not result.ok:
+                self._record_failed_files([result])
+                continue
+
+            logger.debug(f"Loaded {len(result.documents)} documents from {result.file}")
+
+            yield result.file, result.documents
+
+    def _ingest_window(self, window: list[tuple[Path, list[Document]]]) -> bool:
+        """Run a window of parsed files through the pipeline (split, embed, upsert).
+
+        Args:
+            window (list[tuple[Path, list[Document]]]): The files and their parsed documents.
+
+        Returns:
+            bool: True if ingestion was successful, False otherwise
+        """
+        files = [file for file, _ in window]
+        docs = [doc for _, file_docs in window for doc in file_docs]
+
+        try:
+            processed_nodes = self._replace_files(
+                files,
+                docs,
+                show_progress=False,
+                num_workers=settings.PIPELINE_NUM_WORKERS_BATCH,
+            )
+            logger.info(
+                f"Processed & ingested {len(processed_nodes)} nodes from {len(files)} files."
+            )
+
+        except Exception as e:
+            logger.error(f"Window ingestion failed: {e}", exc_info=True)
+            return False
+
         return True
+
+    def _prune_removed_files(self, directory: Path):
+        """Delete the points of files that were ingested before but no longer exist."""
+        assert self.manifest is not None
+
+        for entry in self.manifest.entries_under(directory):
+            if Path(entry.path).is_file():
+                continue
+
+            logger.info(f"File {entry.path} was removed, deleting its nodes.")
+            if entry.node_ids:
+                self.vector_store.delete_nodes(entry.node_ids)
+            self.manifest.remove(entry.path)
+
+    def _replace_files(
+        self,
+        files: list[Path],
+        docs: list[Document],
+        show_progress: bool,
+        num_workers: int,
+    ) -> list[BaseNode]:
+        """Run the documents of files through the pipeline and replace their previous nodes.
+
+        The previous nodes are only deleted once the new nodes are upserted and recorded in the
+        manifest, so a failed run leaves the previous version of the files searchable.
+
+        Returns:
+            list[BaseNode]: The ingested nodes.
+        """
+        stale_node_ids = self._get_stale_node_ids(files)
+
+        # Pipeline includes embeddings and vector db, so this is all we need to run
+        processed_nodes = self._pipeline.run(
+            show_progress=show_progress, documents=docs, num_workers=num_workers
+        )
+        self._record_ingested_files(files, processed_nodes)
+
+        new_node_ids = {node.node_id for node in processed_nodes}
+        stale_node_ids = [id_ for id_ in stale_node_ids if id_ not in new_node_ids]
+        if stale_node_ids:
+            logger.info(
+                f"Deleting {len(stale_node_ids)} stale nodes of {len(files)} re-ingested files"
+            )
+            self.vector_store.delete_nodes(stale_node_ids)
+
+        return processed_nodes
+
+    def _get_stale_node_ids(self, files: list[Path]) -> list[str]:
+        """Get the IDs of the previously ingested nodes of files that are about to be re-ingested.
+
+        Files the manifest has not seen may still have nodes, ingested before the manifest was
+        enabled, which are looked up in the vector store by filename.
+        """
+        if self.manifest is None:
+            return []
+
+        node_ids = []
+        for file in files:
+            entry = self.manifest.get(file)
+            if entry is not None:
+                node_ids.extend(entry.node_ids)
+                continue
+
+            metadata = file_metadata(file.name)
+            # project_id and doc_id are indexed, the filename tells files of a document apart
+            filters = MetadataFilters(
+                filters=[
+                    MetadataFilter(key=key, value=metadata[key])
+                    for key in ("project_id", "doc_id", "filename")
+                ]
+            )
+            node_ids.extend(
+                node.node_id for node in self.vector_store.get_nodes(filters=filters)
+            )
+
+        return node_ids
+
+    def _record_failed_files(self, results: list[ParseResult]):
+        """Record the files that could not be parsed, and why, in the manifest."""
+        if self.manifest is None:
+            return
+
+        for result in results:
+            self.manifest.record_failure(result.file, result.error or "")
+
+    def _record_ingested_files(self, files: list[Path], nodes: list[BaseNode]):
+        """Record the ingested files and the IDs of their nodes in the manifest.
+
+        Nodes are matched to their file by the filename stored in their metadata.
+        """
+        if self.manifest is None:
+            return
+
+        node_ids_by_filename: dict[str, list[str]] = {}
+        for node in nodes:
+            filename = node.metadata.get("filename")
+            node_ids_by_filename.setdefault(filename, []).append(node.node_id)
+
+        for file in files:
+            self.manifest.record(file, node_ids_by_filename.get(file.name, []))
@@ -0,0 +1,173 @@
+"""
+Isolated, parallel file parsing.
+
+A single pathological PDF or DOCX can make a reader hang or exhaust memory, which used to take the
+whole batch (or the api process) down with it. parse_files parses every file in its own process,
+with at most PARSER_TIMEOUT seconds and PARSER_MAX_MEMORY bytes of address space. A file that
+times out, runs out of memory or crashes its parser is reported as a failed ParseResult, and the
+other files are unaffected.
+
+Parser processes are forked from a forkserver that has this module preloaded, so starting one
+costs a fork, not an interpreter start and the llama-index imports.
+"""
+
+import logging
+import multiprocessing
+import resource
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from llama_index.core.readers import SimpleDirectoryReader
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import Document
+from ml_api.config import settings
+
+from .naive.metadata import file_metadata
+from .tables import DocxTableReader
+
+logger = logging.getLogger(__name__)
+
+_context = None
+
+
+@dataclass
+class ParseResult:
+    file: Path
+    documents: list[Document] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class _ParseTask:
+    file: Path
+    process: multiprocessing.Process
+    deadline: float
+
+
+def _get_context():
+    global _context
+
+    if _context is None:
+        _context = multiprocessing.get_context("forkserver")
+        _context.set_forkserver_preload([__name__])
+    return _context
+
+
+def _get_file_extractor() -> dict[str, BaseReader]:
+    """Readers used instead of SimpleDirectoryReader's defaults, by file extension."""
+    if not settings.DOCX_TABLE_EXTRACTION:
+        return {}
+    return {".docx": DocxTableReader()}
+
+
+def _parse_in_process(file: str, connection: Connection, max_memory: int):
+    """Parser process entry point, sends ("ok", documents) or ("error", message)."""
+    if max_memory > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+    try:
+        reader = SimpleDirectoryReader(
+            input_files=[file],
+            file_metadata=file_metadata,
+            file_extractor=_get_file_extractor(),
+        )
+        connection.send(("ok", reader.load_data()))
+    except BaseException as e:
+        connection.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+
+
+def parse_files(
+    files: Iterable[Path],
+    num_workers: int = settings.READER_NUM_WORKERS_BATCH,
+    timeout: float = settings.PARSER_TIMEOUT,
+    max_memory: int = settings.PARSER_MAX_MEMORY,
+) -> Iterator[ParseResult]:
+    """Parse files in separate processes, yielding each result as soon as it is done.
+
+    Args:
+        files (Iterable[Path]): The files to parse, consumed lazily.
+        num_workers (int, optional): The maximum number of parser processes. Defaults to settings.READER_NUM_WORKERS_BATCH.
+        timeout (float, optional): Seconds after which a parser is killed. Defaults to settings.PARSER_TIMEOUT.
+        max_memory (int, optional): Address space limit of a parser in bytes, 0 for none. Defaults to settings.PARSER_MAX_MEMORY.
+
+    Yields:
+        ParseResult: The documents of a file, or why it failed. Results are in completion order.
+    """
+    context = _get_context()
+    files = iter(files)
+    running: dict[Connection, _ParseTask] = {}
+
+    try:
+        while True:
+            while len(running) < max(num_workers, 1):
+                file = next(files, None)
+                if file is None:
+                    break
+
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(
+                    target=_parse_in_process,
+                    args=(str(file), sender, max_memory),
+                    daemon=True,
+                )
+                process.start()
+                sender.close()
+                running[receiver] = _ParseTask(
+                    file, process, time.monotonic() + timeout
+                )
+
+            if not running:
+                return
+
+            next_deadline = min(task.deadline for task in running.values())
+            ready = wait(
+                list(running), timeout=max(next_deadline - time.monotonic(), 0)
+            )
+
+            for receiver in ready:
+                task = running.pop(receiver)  # type: ignore
+                try:
+                    status, payload = receiver.recv()  # type: ignore
+                except EOFError:
+                    task.process.join()
+                    status, payload = (
+                        "error",
+                        f"Parser process exited with code {task.process.exitcode}",
+                    )
+                receiver.close()  # type: ignore
+                task.process.join()
+
+                if status == "ok":
+                    yield ParseResult(task.file, documents=payload)
+                else:
+                    logger.error(f"Failed to parse {task.file}: {payload}")
+                    yield ParseResult(task.file, error=payload)
+
+            now = time.monotonic()
+            for receiver, task in list(running.items()):
+                if now < task.deadline:
+                    continue
+
+                running.pop(receiver)
+                task.process.kill()
+                task.process.join()
+                receiver.close()
+
+                error = f"Parsing timed out after {timeout} seconds"
+                logger.error(f"Failed to parse {task.file}: {error}")
+                yield ParseResult(task.file, error=error)
+    finally:
+        # The consumer stopped early or failed, don't leave parsers behind
+        for receiver, task in running.items():
+            task.process.kill()
+            task.process.join()
+            receiver.close()
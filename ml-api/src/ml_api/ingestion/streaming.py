@@ -0,0 +1,112 @@
+"""
+Helpers to build bounded-memory generator pipelines for ingestion.
+
+Stages are plain generators (walk -> read -> window -> run), `prefetch` lets a stage run ahead
+of its consumer in a background thread while bounding how many items are held in memory.
+"""
+
+import logging
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def prefetch(iterable: Iterable[T], max_in_flight: int) -> Iterator[T]:
+    """Consume an iterable in a background thread, keeping at most `max_in_flight` items buffered.
+
+    This lets a slow producer (e.g. parsing files) overlap with a slow consumer (e.g. embedding),
+    without materialising the whole iterable. Exceptions raised by the producer are re-raised
+    in the consumer.
+
+    Args:
+        iterable (Iterable[T]): The items to produce.
+        max_in_flight (int): The maximum number of produced items waiting to be consumed.
+
+    Yields:
+        T: The items of the iterable, in order.
+    """
+    if max_in_flight <= 0:
+        yield from iterable
+        return
+
+    buffer: queue.Queue = queue.Queue(maxsize=max_in_flight)
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put(item):
+                    return
+        except BaseException as e:
+            _put(e)
+            return
+        _put(_DONE)
+
+    producer = threading.Thread(target=_produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join(timeout=1)
+
+
+def window_by_size(
+    items: Iterable[T],
+    max_size: int,
+    size_fn: Callable[[T], int] = lambda _: 1,
+    max_items: int | None = None,
+) -> Iterator[list[T]]:
+    """Group items into windows whose total size reaches at most (about) `max_size`.
+
+    Items are never split, so a single item larger than `max_size` forms its own window.
+
+    Args:
+        items (Iterable[T]): The items to group.
+        max_size (int): The size at which a window is emitted.
+        size_fn (Callable[[T], int], optional): The size of an item. Defaults to 1 per item.
+        max_items (int | None, optional): The maximum number of items in a window. Defaults to None.
+
+    Yields:
+        list[T]: A window of items.
+    """
+    window: list[T] = []
+    window_size = 0
+
+    for item in items:
+        item_size = size_fn(item)
+        if window and window_size + item_size > max_size:
+            yield window
+            window, window_size = [], 0
+
+        window.append(item)
+        window_size += item_size
+
+        if window_size >= max_size or (max_items and len(window) >= max_items):
+            yield window
+            window, window_size = [], 0
+
+    if window:
+        yield window
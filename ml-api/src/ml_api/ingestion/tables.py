@@ -0,0 +1,296 @@
+"""
+Structured table extraction for DOCX ingestion.
+
+GEF ProDocs and PIFs keep much of their content (financing plans, results frameworks, risk logs)
+in tables, which the default DOCX reader flattens into one line per cell. Retrieval then returns
+chunks of shredded table fragments that take up top-k slots without answering anything.
+
+DocxTableReader reads the body text of a DOCX without its tables, and every table as separate
+markdown documents with metadata content_type="table". Merged cells are aligned to the table
+grid (grid_span, vertically merged cells repeat the value above), and nested tables are inlined
+into their cell. Tables longer than a chunk are split into parts of whole rows, each with the
+table title and header, that fit in CHUNK_SIZE tokens together with the embedded metadata.
+TableAwareSplitter keeps these parts whole instead of letting the sentence splitter cut them up,
+only a part with a single row that is longer than a chunk is split like text.
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Any, Callable, Iterator, Sequence
+
+from docx import Document as DocxDocument
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.readers.base import BaseReader
+from llama_index.core.schema import (
+    BaseNode,
+    Document,
+    MetadataMode,
+    TransformComponent,
+)
+from llama_index.core.utils import get_tokenizer
+from ml_api.config import settings
+
+logger = logging.getLogger(__name__)
+
+TABLE_CONTENT_TYPE = "table"
+TABLE_TITLE_MAX_LENGTH = 200  # characters of a preceding paragraph used as table title
+
+# Table metadata that is bookkeeping or already in the text, left out for the embedding model and LLM
+TABLE_EXCLUDED_METADATA_KEYS = [
+    "table_title",
+    "table_index",
+    "table_part",
+    "table_rows",
+    "table_columns",
+]
+
+
+def _clean_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _cell_text(cell: _Cell) -> str:
+    """The text of a cell as a single markdown table cell, with nested tables inlined."""
+    parts = [_clean_text(cell.text)]
+    for nested_table in cell.tables:
+        for row in table_rows(nested_table):
+            parts.append("; ".join(text for text in row if text))
+
+    text = "<br>".join(part for part in parts if part)
+    return text.replace("|", "\\|")
+
+
+def table_rows(table: Table) -> list[list[str]]:
+    """Extract the cell texts of a table, aligned to the table grid.
+
+    A horizontally merged cell (grid_span) has its text in its first grid column and empty
+    strings in the others. A vertically merged cell repeats the text of the cell above, so
+    every row can be read on its own.
+
+    Returns:
+        list[list[str]]: The rows of the table, all with the same number of columns.
+    """
+    rows: list[list[str]] = []
+
+    for row in table.rows:
+        row_data = [""] * row.grid_cols_before
+        for tc in row._tr.tc_lst:
+            column = len(row_data)
+            if tc.vMerge == "continue" and rows and column < len(rows[-1]):
+                text = rows[-1][column]
+            else:
+                text = _cell_text(_Cell(tc, table))
+
+            row_data.append(text)
+            row_data.extend([""] * (tc.grid_span - 1))
+        row_data.extend([""] * row.grid_cols_after)
+        rows.append(row_data)
+
+    num_columns = max((len(row) for row in rows), default=0)
+    return [row + [""] * (num_columns - len(row)) for row in rows]
+
+
+def _distinct_texts(row: list[str]) -> set[str]:
+    return set(row) - {""}
+
+
+def _markdown_row(row: list[str]) -> str:
+    return "| " + " | ".join(row) + " |"
+
+
+def table_to_markdown(header: list[str], rows: list[list[str]]) -> str:
+    """Render a table as a markdown table."""
+    lines = [_markdown_row(header), _markdown_row(["---"] * len(header))]
+    lines.extend(_markdown_row(row) for row in rows)
+    return "\n".join(lines)
+
+
+def split_rows(
+    header: list[str],
+    rows: list[list[str]],
+    max_tokens: int,
+    count_tokens: Callable[[str], int],
+) -> list[list[list[str]]]:
+    """Group table rows, in order, into parts that fit in max_tokens together with the header.
+
+    A row that doesn't fit in max_tokens on its own gets a part of its own.
+    """
+    budget = max_tokens - count_tokens(table_to_markdown(header, []))
+    parts: list[list[list[str]]] = []
+    part: list[list[str]] = []
+    part_tokens = 0
+
+    for row in rows:
+        # Rows are joined with newlines, which are tokens too
+        row_tokens = count_tokens("\n" + _markdown_row(row))
+        if part and part_tokens + row_tokens > budget:
+            parts.append(part)
+            part = []
+            part_tokens = 0
+        part.append(row)
+        part_tokens += row_tokens
+
+    if part:
+        parts.append(part)
+    return parts
+
+
+class DocxTableReader(BaseReader):
+    """Reads a DOCX as its body text and a markdown document per table (part)."""
+
+    def __init__(self, max_table_tokens: int = settings.CHUNK_SIZE):
+        self.max_table_tokens = max_table_tokens
+        self._tokenizer: Callable[[str], list] | None = None
+
+    def _count_tokens(self, text: str) -> int:
+        if self._tokenizer is None:
+            self._tokenizer = get_tokenizer()
+        return len(self._tokenizer(text))
+
+    def load_data(
+        self, file: Path, extra_info: dict | None = None, **kwargs: Any
+    ) -> list[Document]:
+        metadata = extra_info or {}
+        docx = DocxDocument(str(file))
+
+        paragraphs: list[str] = []
+        table_documents: list[Document] = []
+        num_tables = 0
+
+        for block in docx.iter_inner_content():
+            if isinstance(block, Paragraph):
+                if text := block.text.strip():
+                    paragraphs.append(text)
+                continue
+
+            rows = [row for row in table_rows(block) if any(row)]
+
+            # Single column tables are used for layout (boxes, banners), keep them as text
+            if all(len(_distinct_texts(row)) == 1 for row in rows):
+                paragraphs.extend(next(iter(_distinct_texts(row))) for row in rows)
+                continue
+
+            caption = paragraphs[-1] if paragraphs else ""
+            table_documents.extend(
+                self._table_documents(rows, num_tables, caption, metadata)
+            )
+            num_tables += 1
+
+        documents = []
+        if paragraphs:
+            documents.append(Document(text="\n\n".join(paragraphs), metadata=metadata))
+        documents.extend(table_documents)
+
+        logger.debug(f"Extracted {num_tables} tables from {file}")
+        return documents
+
+    def _table_documents(
+        self,
+        rows: list[list[str]],
+        table_index: int,
+        caption: str,
+        metadata: dict,
+    ) -> Iterator[Document]:
+        """Build the documents of a table, split into parts of whole rows if it is too long."""
+        # Leading rows with a single cell spanning the table are its title
+        title_rows = []
+        while len(rows) > 1 and rows[0][0] and not any(rows[0][1:]):
+            title_rows.append(rows.pop(0)[0])
+
+        title = " ".join(title_rows) or caption[:TABLE_TITLE_MAX_LENGTH]
+        header, body = rows[0], rows[1:]
+        heading = title or f"Table {table_index + 1}"
+
+        table_metadata = {
+            **metadata,
+            "content_type": TABLE_CONTENT_TYPE,
+            "table_title": title,
+            "table_index": table_index,
+            "table_columns": len(header),
+        }
+
+        # The metadata is embedded with the text, like in the sentence splitter it counts against the budget
+        metadata_str = Document(
+            text="",
+            metadata=table_metadata,
+            excluded_embed_metadata_keys=TABLE_EXCLUDED_METADATA_KEYS,
+        ).get_metadata_str(MetadataMode.EMBED)
+        prefix_tokens = self._count_tokens(f"{metadata_str}\n\n{heading}\n\n")
+
+        parts = split_rows(
+            header, body, self.max_table_tokens - prefix_tokens, self._count_tokens
+        )
+        parts = [
+            fitted_part
+            for part in parts or [[]]
+            for fitted_part in self._fit_part(heading, header, part, table_metadata)
+        ]
+        for part_index, part in enumerate(parts):
+            yield self._table_document(
+                heading, header, part, {**table_metadata, "table_part": part_index}
+            )
+
+    def _table_document(
+        self, heading: str, header: list[str], rows: list[list[str]], metadata: dict
+    ) -> Document:
+        return Document(
+            text=f"{heading}\n\n{table_to_markdown(header, rows)}",
+            metadata={**metadata, "table_rows": len(rows)},
+            excluded_embed_metadata_keys=list(TABLE_EXCLUDED_METADATA_KEYS),
+            excluded_llm_metadata_keys=list(TABLE_EXCLUDED_METADATA_KEYS),
+        )
+
+    def _fit_part(
+        self, heading: str, header: list[str], rows: list[list[str]], metadata: dict
+    ) -> Iterator[list[list[str]]]:
+        """Split a part in halves until it fits in max_table_tokens with its metadata.
+
+        split_rows counts the tokens of every row on its own, which can be a few tokens off from
+        the tokens of the joined text.
+        """
+        document = self._table_document(heading, header, rows, metadata)
+        tokens = self._count_tokens(document.get_content(MetadataMode.EMBED))
+        if len(rows) <= 1 or tokens <= self.max_table_tokens:
+            yield rows
+            return
+
+        middle = len(rows) // 2
+        yield from self._fit_part(heading, header, rows[:middle], metadata)
+        yield from self._fit_part(heading, header, rows[middle:], metadata)
+
+
+class TableAwareSplitter(TransformComponent):
+    """Splits documents with a sentence splitter, table documents that fit in a chunk are kept whole."""
+
+    splitter: SentenceSplitter
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TableAwareSplitter"
+
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any) -> list[BaseNode]:
+        text_nodes = []
+        table_nodes: list[BaseNode] = []
+        tokenizer = get_tokenizer()
+
+        for node in nodes:
+            # A single table row can be longer than a chunk, it is split like text
+            if node.metadata.get("content_type") != TABLE_CONTENT_TYPE or (
+                len(tokenizer(node.get_content(metadata_mode=MetadataMode.EMBED)))
+                > self.splitter.chunk_size
+            ):
+                text_nodes.append(node)
+                continue
+
+            # One node per table part, linked to its document like the splitter's nodes
+            for table_node in build_nodes_from_splits(
+                [node.get_content()], node, id_func=self.splitter.id_func
+            ):
+                table_node.metadata.update(node.metadata)
+                table_nodes.append(table_node)
+
+        return self.splitter(text_nodes, **kwargs) + table_nodes
@@ -0,0 +1,137 @@
+"""
+Persistent cache of VLM OCR results.
+
+OCR output for an identical page image, model and prompt is treated as deterministic, so results
+are stored in SQLite keyed by a hash of all three. Re-ingesting a document (e.g. to experiment with
+chunking or embeddings) then skips the VLM entirely for pages it has already seen.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from pathlib import Path
+
+from ml_api.config import settings
+from ml_api.utils.sqlite import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+EVICTION_TARGET_RATIO = 0.9  # evict down to this fraction of max_bytes
+
+
+class OCRCache:
+    """SQLite backed OCR result cache with least-recently-used eviction by total text size."""
+
+    def __init__(
+        self, db_path: Path | str, max_bytes: int = settings.OCR_CACHE_MAX_BYTES
+    ):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = connect_sqlite(self.db_path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS ocr_results_last_access ON ocr_results (last_access)"
+        )
+        self._connection.commit()
+
+        self._size_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM ocr_results"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(image_base64: str, model_name: str, prompt: str) -> str:
+        """Build the cache key of a page image for a given model and prompt."""
+        digest = hashlib.sha256()
+        for part in (image_base64, model_name, prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """Get a cached OCR result, or None on a miss."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT text FROM ocr_results WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._connection.execute(
+                "UPDATE ocr_results SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._connection.commit()
+
+        return row[0]
+
+    def put(self, key: str, text: str):
+        """Store an OCR result, evicting the least recently used results if the cache is full."""
+        size = len(text.encode("utf-8"))
+
+        with self._lock:
+            previous = self._connection.execute(
+                "SELECT size FROM ocr_results WHERE key = ?", (key,)
+            ).fetchone()
+
+            self._connection.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, text, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, text, size, time.time()),
+            )
+            self._size_bytes += size - (previous[0] if previous else 0)
+
+            if self._size_bytes > self.max_bytes:
+                self._evict()
+
+            self._connection.commit()
+
+    def _evict(self):
+        """Delete the least recently used results until the cache is below its eviction target."""
+        target = self.max_bytes * EVICTION_TARGET_RATIO
+        evicted = 0
+
+        rows = self._connection.execute(
+            "SELECT key, size FROM ocr_results ORDER BY last_access ASC"
+        )
+        keys_to_evict = []
+        for key, size in rows:
+            if self._size_bytes <= target:
+                break
+            keys_to_evict.append((key,))
+            self._size_bytes -= size
+            evicted += 1
+
+        self._connection.executemany(
+            "DELETE FROM ocr_results WHERE key = ?", keys_to_evict
+        )
+        logger.info(f"Evicted {evicted} results from the OCR cache.")
+
+    def stats(self) -> dict[str, int | float]:
+        """Get the hit/miss counters and size of the cache."""
+        with self._lock:
+            entries = self._connection.execute(
+                "SELECT COUNT(*) FROM ocr_results"
+            ).fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": self._size_bytes,
+        }
@@ -1,17 +1,32 @@
 import base64
 import io
+import math
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable, Iterator
 
 import pdf2image
 from ml_api.config import settings
 from openai import OpenAI
+from PIL import Image
 
+from .ocr_cache import OCRCache
 
-def document_to_base64_images(document_path: Path):
+LOSSY_IMAGE_FORMATS = ("JPEG", "WEBP")
+
+OCR_PROMPT = "Return the plain text representation of this document as if you were reading it naturally.\n"
+
+
+def document_to_base64_images(document_path: Path) -> list[str]:
     """
     Given a document path, convert it to a list of base64 encoded strings, each representing a page in the document.
 
-    Currently, only PDF documents are supported.
+    Currently, only PDF documents are supported. This holds every page in memory, prefer
+    iter_document_base64_images for large documents.
 
     Args:
         document_path (Path): The path to the document.
@@ -19,12 +34,31 @@ def document_to_base64_images(document_path: Path):
     Returns:
         List[str]: A list of base64 encoded strings, each representing a page in the document.
 
+    Raises:
+        ValueError: If the document type is not supported.
+    """
+    return list(iter_document_base64_images(document_path))
+
+
+def iter_document_base64_images(document_path: Path) -> Iterator[str]:
+    """
+    Given a document path, lazily convert it to base64 encoded strings, each representing a page in the document.
+
+    Currently, only PDF documents are supported. The file type is checked when this function is called,
+    pages are only rendered as the returned iterator is consumed.
+
+    Args:
+        document_path (Path): The path to the document.
+
+    Returns:
+        Iterator[str]: An iterator of base64 encoded strings, each representing a page in the document.
+
     Raises:
         ValueError: If the document type is not supported.
     """
     match document_path.suffix.lower():
         case ".pdf":
-            return pdf_to_base64_images(document_path)
+            return iter_pdf_base64_images(document_path)
         case _:
             raise ValueError(f"Unsupported file type: {document_path.suffix}")
 
@@ -33,33 +67,212 @@ def pdf_to_base64_images(pdf_path: Path) -> list[str]:
     """
     Given a PDF path, convert it to a list of base64 encoded strings, each representing a page in the document.
 
+    Pages are prepared for the VLM with the settings.VLM_IMAGE_* settings.
+
     Args:
         pdf_path (Path): The path to the PDF document.
 
     Returns:
         List[str]: A list of base64 encoded strings, each representing a page in the document.
     """
-    page_images = pdf2image.convert_from_path(pdf_path, dpi=settings.PDF_2_PNG_DPI)
-    base64_images: list[str] = []
+    return list(iter_pdf_base64_images(pdf_path))
+
+
+def get_pdf_page_count(pdf_path: Path) -> int:
+    """Get the number of pages in a PDF without rendering it."""
+    return int(pdf2image.pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def get_render_dpi(
+    pdf_path: Path,
+    max_dpi: int = settings.PDF_2_PNG_DPI,
+    max_pixels: int = settings.VLM_IMAGE_MAX_PIXELS,
+) -> int:
+    """
+    Pick the DPI to render a PDF at so its pages fit the VLM's pixel budget.
+
+    Rendering at 300 DPI only for the model to downsample the page wastes render and encode time,
+    so the DPI is lowered until a page of the size of the first page fits `max_pixels`.
+
+    Args:
+        pdf_path (Path): The path to the PDF document.
+        max_dpi (int, optional): The highest DPI to render at. Defaults to settings.PDF_2_PNG_DPI.
+        max_pixels (int, optional): The pixel budget of the VLM, 0 for no budget. Defaults to settings.VLM_IMAGE_MAX_PIXELS.
+
+    Returns:
+        int: The DPI to render at.
+    """
+    if not max_pixels:
+        return max_dpi
+
+    try:
+        # e.g. "612 x 792 pts (letter)"
+        page_size = pdf2image.pdfinfo_from_path(pdf_path)["Page size"]
+        width_pts, _, height_pts = page_size.split()[:3]
+        page_area_inches = (float(width_pts) / 72) * (float(height_pts) / 72)
+    except (KeyError, ValueError):
+        return max_dpi
+
+    budget_dpi = math.floor(math.sqrt(max_pixels / page_area_inches))
+    return max(1, min(max_dpi, budget_dpi))
+
+
+def prepare_page_image(
+    image: Image.Image,
+    image_format: str = settings.VLM_IMAGE_FORMAT,
+    quality: int = settings.VLM_IMAGE_QUALITY,
+    max_pixels: int = settings.VLM_IMAGE_MAX_PIXELS,
+) -> str:
+    """
+    Prepare a page image for the VLM: fit it to the pixel budget and encode it as base64.
+
+    The image is resized in place and encoded once into a single buffer, which is base64 encoded
+    without intermediate copies.
+
+    Args:
+        image (Image.Image): The page image, it may be modified in place.
+        image_format (str, optional): PNG, JPEG or WEBP. Defaults to settings.VLM_IMAGE_FORMAT.
+        quality (int, optional): The quality of lossy formats (1-100). Defaults to settings.VLM_IMAGE_QUALITY.
+        max_pixels (int, optional): The pixel budget of the VLM, 0 for no budget. Defaults to settings.VLM_IMAGE_MAX_PIXELS.
+
+    Returns:
+        str: The base64 encoded image.
+    """
+    image_format = image_format.upper()
+
+    if max_pixels and image.width * image.height > max_pixels:
+        scale = math.sqrt(max_pixels / (image.width * image.height))
+        image.thumbnail(
+            (math.floor(image.width * scale), math.floor(image.height * scale)),
+            Image.Resampling.LANCZOS,
+        )
+
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    save_kwargs = {}
+    if image_format in LOSSY_IMAGE_FORMATS:
+        save_kwargs["quality"] = quality
+
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **save_kwargs)
+
+    return base64.b64encode(buffer.getbuffer()).decode("ascii")
+
+
+def image_mime_type(image_format: str = settings.VLM_IMAGE_FORMAT) -> str:
+    """Get the mime type of an image format, e.g. image/png for PNG."""
+    return f"image/{image_format.lower()}"
+
+
+def iter_pdf_base64_images(
+    pdf_path: Path,
+    page_numbers: Iterable[int] | None = None,
+    image_format: str = settings.VLM_IMAGE_FORMAT,
+    quality: int = settings.VLM_IMAGE_QUALITY,
+    max_pixels: int = settings.VLM_IMAGE_MAX_PIXELS,
+) -> Iterator[str]:
+    """
+    Given a PDF path, render it one page at a time, yielding each page as a base64 encoded image.
+
+    Each page is rendered by poppler to an uncompressed file in a temporary folder, prepared for the
+    VLM with prepare_page_image, and deleted before the next page is rendered, so peak memory is a
+    single page regardless of the length of the document.
+
+    Args:
+        pdf_path (Path): The path to the PDF document.
+        page_numbers (Iterable[int] | None, optional): The 1-indexed pages to render. Defaults to all pages.
+        image_format (str, optional): PNG, JPEG or WEBP. Defaults to settings.VLM_IMAGE_FORMAT.
+        quality (int, optional): The quality of lossy formats (1-100). Defaults to settings.VLM_IMAGE_QUALITY.
+        max_pixels (int, optional): The pixel budget of the VLM, 0 for no budget. Defaults to settings.VLM_IMAGE_MAX_PIXELS.
+
+    Yields:
+        str: A base64 encoded image of each page, in the order of `page_numbers`.
+    """
+    if page_numbers is None:
+        page_numbers = range(1, get_pdf_page_count(pdf_path) + 1)
+    dpi = get_render_dpi(pdf_path, max_pixels=max_pixels)
+
+    with tempfile.TemporaryDirectory(prefix="pdf2image_") as output_folder:
+        for page_number in page_numbers:
+            yield render_pdf_page_base64(
+                pdf_path,
+                page_number,
+                output_folder,
+                dpi=dpi,
+                image_format=image_format,
+                quality=quality,
+                max_pixels=max_pixels,
+            )
+
+
+def render_pdf_page_base64(
+    pdf_path: Path,
+    page_number: int,
+    output_folder: str | None = None,
+    dpi: int = settings.PDF_2_PNG_DPI,
+    image_format: str = settings.VLM_IMAGE_FORMAT,
+    quality: int = settings.VLM_IMAGE_QUALITY,
+    max_pixels: int = settings.VLM_IMAGE_MAX_PIXELS,
+) -> str:
+    """
+    Render a single page of a PDF to a base64 encoded image.
+
+    Args:
+        pdf_path (Path): The path to the PDF document.
+        page_number (int): The 1-indexed page to render.
+        output_folder (str | None, optional): The folder poppler writes the page to. Defaults to a new temporary folder.
+        dpi (int, optional): The DPI to render at. Defaults to settings.PDF_2_PNG_DPI.
+        image_format (str, optional): PNG, JPEG or WEBP. Defaults to settings.VLM_IMAGE_FORMAT.
+        quality (int, optional): The quality of lossy formats (1-100). Defaults to settings.VLM_IMAGE_QUALITY.
+        max_pixels (int, optional): The pixel budget of the VLM, 0 for no budget. Defaults to settings.VLM_IMAGE_MAX_PIXELS.
+
+    Returns:
+        str: The base64 encoded image of the page.
+    """
+    if output_folder is None:
+        with tempfile.TemporaryDirectory(prefix="pdf2image_") as tmp_folder:
+            return render_pdf_page_base64(
+                pdf_path,
+                page_number,
+                tmp_folder,
+                dpi=dpi,
+                image_format=image_format,
+                quality=quality,
+                max_pixels=max_pixels,
+            )
 
-    for image in page_images:
-        tmp_image_file = io.BytesIO()
-        image.save(tmp_image_file, "PNG")
-        tmp_image_file.seek(0)
-        image_bytes = tmp_image_file.read()
+    page_paths = pdf2image.convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=page_number,
+        last_page=page_number,
+        output_folder=output_folder,
+        fmt="ppm",
+        paths_only=True,
+    )
 
-        base64_images.append(base64.b64encode(image_bytes).decode("utf-8"))
+    image_base64 = ""
+    for page_path in page_paths:
+        with Image.open(page_path) as image:
+            image_base64 = prepare_page_image(
+                image, image_format=image_format, quality=quality, max_pixels=max_pixels
+            )
+        os.remove(page_path)
 
-    return base64_images
+    return image_base64
 
 
-def do_ocr_on_image(img_png_base64: str, client: OpenAI) -> str | None:
+def do_ocr_on_image(
+    img_png_base64: str, client: OpenAI, mime_type: str = "image/png"
+) -> str | None:
     """
     Given an image as a base64 encoded string, performs OCR on the image using the VLLM model.
 
     Args:
-        img_png_base64 (str): The base64 encoded PNG image.
+        img_png_base64 (str): The base64 encoded image.
         client (OpenAI): The OpenAI client used to make the request.
+        mime_type (str, optional): The mime type of the image. Defaults to "image/png".
 
     Returns:
         str | None: The plain text representation of the document, or None if the request failed.
@@ -72,11 +285,13 @@ def do_ocr_on_image(img_png_base64: str, client: OpenAI) -> str | None:
                 "content": [
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{img_png_base64}"},
+                        "image_url": {
+                            "url": f"data:{mime_type};base64,{img_png_base64}"
+                        },
                     },
                     {
                         "type": "text",
-                        "text": "Return the plain text representation of this document as if you were reading it naturally.\n",
+                        "text": OCR_PROMPT,
                     },
                 ],
             }
@@ -86,6 +301,89 @@ def do_ocr_on_image(img_png_base64: str, client: OpenAI) -> str | None:
     return response.choices[0].message.content
 
 
+_endpoint_semaphores: dict[str, threading.BoundedSemaphore] = {}
+_endpoint_semaphores_lock = threading.Lock()
+
+
+def get_endpoint_semaphore(
+    base_url: str, max_in_flight: int = settings.VLM_OCR_MAX_IN_FLIGHT
+) -> threading.BoundedSemaphore:
+    """
+    Get the semaphore bounding the number of in-flight OCR requests to a VLM endpoint.
+
+    The semaphore is shared by everything in the process that sends requests to the same endpoint,
+    so concurrent ingestion jobs don't multiply the load on the vLLM server.
+
+    Args:
+        base_url (str): The base url of the VLM endpoint.
+        max_in_flight (int, optional): The maximum number of in-flight requests, only used when the
+            semaphore is first created. Defaults to settings.VLM_OCR_MAX_IN_FLIGHT.
+
+    Returns:
+        threading.BoundedSemaphore: The semaphore for the endpoint.
+    """
+    with _endpoint_semaphores_lock:
+        if base_url not in _endpoint_semaphores:
+            _endpoint_semaphores[base_url] = threading.BoundedSemaphore(max_in_flight)
+        return _endpoint_semaphores[base_url]
+
+
+def ocr_images(
+    images: Iterable[str],
+    client: OpenAI,
+    max_in_flight: int = settings.VLM_OCR_MAX_IN_FLIGHT,
+    cache: OCRCache | None = None,
+    mime_type: str = image_mime_type(),
+) -> Iterator[str | None]:
+    """
+    Performs OCR on a sequence of base64 encoded images concurrently, yielding the results in input order.
+
+    Up to `max_in_flight` requests are sent to the VLM endpoint at once so vLLM can batch them. Images
+    are consumed lazily, at most `max_in_flight` of them are held in memory waiting for a result.
+    If a cache is given it is consulted before sending a request, so cached pages never hit the VLM.
+
+    Args:
+        images (Iterable[str]): The base64 encoded images, e.g. the pages of a document.
+        client (OpenAI): The OpenAI client used to make the requests.
+        max_in_flight (int, optional): The maximum number of concurrent requests. Defaults to settings.VLM_OCR_MAX_IN_FLIGHT.
+        cache (OCRCache | None, optional): The OCR result cache. Defaults to None.
+        mime_type (str, optional): The mime type of the images. Defaults to the type of settings.VLM_IMAGE_FORMAT.
+
+    Yields:
+        str | None: The text of each image, or None if the request returned no content.
+    """
+    semaphore = get_endpoint_semaphore(str(client.base_url), max_in_flight)
+
+    def _ocr(image: str) -> str | None:
+        if cache is not None:
+            key = OCRCache.make_key(image, settings.VLLM_VLM_MODEL_NAME, OCR_PROMPT)
+            if (text := cache.get(key)) is not None:
+                return text
+
+        with semaphore:
+            text = do_ocr_on_image(image, client, mime_type=mime_type)
+
+        if cache is not None and text is not None:
+            cache.put(key, text)
+
+        return text
+
+    executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="ocr")
+    pending: deque[Future] = deque()
+
+    try:
+        for image in images:
+            pending.append(executor.submit(_ocr, image))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 def encode_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode("utf-8")
@@ -4,30 +4,37 @@ from pathlib import Path
 from llama_index.core.schema import Document
 from llama_index.core.vector_stores.types import BasePydanticVectorStore
 from ml_api.config import settings
-from ml_api.utils.qdrant import get_qdrant_vector_store
-from openai import OpenAI
+from ml_api.utils.clients import get_clients
 
 from ..base import BaseIngestionService
+from ..naive.gef_documents import extract_and_identify_filename
 from ..pipeline import get_pipeline
-from .rolmocr_utils import do_ocr_on_image, document_to_base64_images
+from .ocr_cache import OCRCache
+from .rolmocr_utils import iter_document_base64_images, ocr_images
 
 logger = logging.getLogger(__name__)
 
 
 class VLMIngestionService(BaseIngestionService):
-    def __init__(self, vector_store: BasePydanticVectorStore | None = None):
+    def __init__(
+        self,
+        vector_store: BasePydanticVectorStore | None = None,
+        ocr_cache: OCRCache | None = None,
+    ):
         super().__init__()
 
         if settings.VLLM_VLM_URL is None:
             raise ValueError("VLLM_VLM_URL is not set in the environment variables.")
 
         self.vector_store = (
-            get_qdrant_vector_store() if vector_store is None else vector_store
+            get_clients().vector_store if vector_store is None else vector_store
         )
 
-        self.oai_client_vlm = OpenAI(
-            base_url=settings.VLLM_VLM_URL, api_key=settings.VLLM_API_KEY
-        )
+        self.oai_client_vlm = get_clients().vlm_client
+
+        if ocr_cache is None and settings.OCR_CACHE_PATH:
+            ocr_cache = OCRCache(settings.OCR_CACHE_PATH)
+        self.ocr_cache = ocr_cache
 
         self._pipeline = get_pipeline()
 
@@ -67,8 +74,6 @@ class VLMIngestionService(BaseIngestionService):
                 documents=documents,
                 num_workers=settings.PIPELINE_NUM_WORKERS_SINGLE,
             )
-            if settings.PIPELINE_PERSIST:
-                self._pipeline.persist(persist_dir=settings.PIPELINE_PERSIST_PATH)
 
             logger.info(
                 f"Processed & ingested {len(processed_nodes)} nodes from {file}"
@@ -113,8 +118,8 @@ class VLMIngestionService(BaseIngestionService):
             list[Document]: A list of LlamaIndex Document objects created from the text extracted from the document.
 
         The function performs the following steps:
-        1. Converts the document to base64 encoded images.
-        2. Performs OCR on each image to extract text.
+        1. Lazily renders the document to base64 encoded images, one page at a time.
+        2. Performs OCR on the images concurrently to extract text, keeping page order.
         3. Constructs LlamaIndex Document objects from the extracted text, incorporating metadata such as filename,
         original filename, file extension, page number, and project ID.
 
@@ -122,37 +127,44 @@ class VLMIngestionService(BaseIngestionService):
         """
 
         try:
-            images = document_to_base64_images(file)
+            images = iter_document_base64_images(file)
         except ValueError as e:
             logger.error(f"Failed to convert document to images: {e}")
             return []
 
-        if not images:
-            logger.warning(f"No images extracted from file: {file}")
-            return []
-
-        # Perform OCR on each image and print the text
-        page_texts = []
-        for image in images:
-            text = do_ocr_on_image(image, self.oai_client_vlm)
+        # Pages are rendered lazily and OCR'd concurrently, results come back in page order
+        page_texts: list[tuple[int, str]] = []
+        num_pages = 0
+        for page_number, text in enumerate(
+            ocr_images(images, self.oai_client_vlm, cache=self.ocr_cache), start=1
+        ):
+            num_pages = page_number
             if text is None or text.strip() == "":
-                logger.warning("OCR returned no text for an image.")
+                logger.warning(f"OCR returned no text for page {page_number}.")
                 continue
 
-            page_texts.append(text)
+            page_texts.append((page_number, text))
             logger.debug(
                 f"Extracted text from image: {text[:100]}..."
             )  # Log first 100 chars
 
+        if num_pages == 0:
+            logger.warning(f"No images extracted from file: {file}")
+            return []
+
+        if self.ocr_cache is not None:
+            logger.info(f"OCR cache stats: {self.ocr_cache.stats()}")
+
         # Now that we have the text, we can create LlamaIndex documents
         documents = []
-        for i, text in enumerate(page_texts):
+        for page_number, text in page_texts:
             metadata = {
                 "filename": file.name,
                 "original_filename": "".join(file.name.split("__")[1:]),
                 "extension": file.suffix,
-                "page_number": i + 1,
+                "page_number": page_number,
                 "project_id": file.name.split("_")[0][1:],
+                "doc_type": extract_and_identify_filename(file.name),
             }
 
             documents.append(Document(text=text, metadata=metadata))
@@ -0,0 +1,9 @@
+from .queue import (
+    INGEST_PROJECTS,
+    RAG_RESPONSE,
+    Job,
+    JobPriority,
+    JobQueue,
+    JobStatus,
+    get_job_queue,
+)
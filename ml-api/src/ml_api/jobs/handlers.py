@@ -0,0 +1,60 @@
+"""
+Job handlers, by job kind.
+
+A handler gets the payload of the job and a progress callback, and returns a JSON serialisable
+result. Raising marks the attempt as failed, so handlers must let errors propagate for the job to
+be retried.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from ml_api.api.tasks import ingest_projects_background, post_ai_response
+from ml_api.ingestion import (
+    BaseIngestionService,
+    HybridIngestionService,
+    NaiveIngestionService,
+    VLMIngestionService,
+)
+from ml_api.jobs.queue import INGEST_PROJECTS, RAG_RESPONSE
+from ml_api.rag_inference.rag_service import generate_rag_response
+
+ProgressCallback = Callable[[float, str], None]
+JobHandler = Callable[[dict[str, Any], ProgressCallback], Awaitable[Any]]
+
+INGESTION_SERVICES: dict[str, type[BaseIngestionService]] = {
+    "naive": NaiveIngestionService,
+    "vlm": VLMIngestionService,
+    "hybrid": HybridIngestionService,
+}
+
+
+async def rag_response(payload: dict[str, Any], on_progress: ProgressCallback) -> str:
+    """Generates a RAG response and posts it to the SCOPE backend."""
+
+    response = await generate_rag_response(payload["question"], payload["project_id"])
+    on_progress(0.5, "RAG response generated")
+
+    await post_ai_response(payload["source"], payload["workspace"], response)
+    return response
+
+
+async def ingest_projects(
+    payload: dict[str, Any], on_progress: ProgressCallback
+) -> list[str]:
+    """Ingests projects with the ingestion service named in the payload."""
+
+    service = INGESTION_SERVICES[payload["service"]]()
+    project_ids = payload["project_ids"]
+
+    # Ingestion is synchronous, keep the event loop free for the heartbeats
+    await asyncio.to_thread(
+        ingest_projects_background, project_ids, service, on_progress
+    )
+    return project_ids
+
+
+HANDLERS: dict[str, JobHandler] = {
+    RAG_RESPONSE: rag_response,
+    INGEST_PROJECTS: ingest_projects,
+}
@@ -0,0 +1,369 @@
+"""
+Durable SQLite backed job queue.
+
+Jobs are claimed by worker processes (see ml_api.jobs.worker) in priority order, lower values
+first, so interactive RAG jobs run ahead of bulk ingestion. Priority only orders the queue, so
+workers can also be restricted to some job kinds, which keeps RAG capacity free while bulk
+ingestion jobs occupy the other workers. A failed job is retried with
+exponential backoff until it runs out of attempts. Running jobs send heartbeats, a job whose
+worker died (e.g. on a pod restart) is put back in the queue once its heartbeat is stale.
+
+The queue database also holds a log of project invalidations, so that processes can drop their
+in-memory caches of projects re-ingested by another process (see ml_api.retrieval.cache).
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from enum import Enum, IntEnum
+from pathlib import Path
+from typing import Any, Sequence
+
+from ml_api.config import settings
+from ml_api.utils.sqlite import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+# Job kinds, see ml_api.jobs.handlers
+RAG_RESPONSE = "rag_response"
+INGEST_PROJECTS = "ingest_projects"
+
+
+INVALIDATION_RETENTION = 24 * 3600  # Seconds project invalidations are kept
+
+
+class JobPriority(IntEnum):
+    RAG = 0
+    INGESTION = 10
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    payload: dict[str, Any]
+    status: JobStatus
+    priority: int
+    attempts: int
+    max_attempts: int
+    progress: float
+    message: str
+    result: Any
+    error: str | None
+    created_at: float
+    updated_at: float
+
+
+JOB_COLUMNS = (
+    "id, kind, payload, status, priority, attempts, max_attempts, progress, message, result, "
+    "error, created_at, updated_at"
+)
+
+
+def _to_job(row: tuple) -> Job:
+    return Job(
+        id=row[0],
+        kind=row[1],
+        payload=json.loads(row[2]),
+        status=JobStatus(row[3]),
+        priority=row[4],
+        attempts=row[5],
+        max_attempts=row[6],
+        progress=row[7],
+        message=row[8],
+        result=json.loads(row[9]) if row[9] is not None else None,
+        error=row[10],
+        created_at=row[11],
+        updated_at=row[12],
+    )
+
+
+class JobQueue:
+    """SQLite backed queue shared by the api process and the worker processes."""
+
+    def __init__(self, db_path: Path | str):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._connection = connect_sqlite(self.db_path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_after REAL NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                heartbeat REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, run_after, created_at)"
+        )
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS project_invalidations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """)
+        self._connection.commit()
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict[str, Any],
+        priority: int = JobPriority.INGESTION,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+    ) -> str:
+        """Add a job to the queue.
+
+        Args:
+            kind (str): The job kind, see ml_api.jobs.handlers.
+            payload (dict[str, Any]): The JSON serialisable arguments of the job.
+            priority (int, optional): Lower runs first. Defaults to JobPriority.INGESTION.
+            max_attempts (int, optional): Attempts before the job fails. Defaults to settings.JOB_MAX_ATTEMPTS.
+
+        Returns:
+            str: The job ID.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO jobs (id, kind, payload, status, priority, max_attempts, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    kind,
+                    json.dumps(payload),
+                    JobStatus.QUEUED.value,
+                    int(priority),
+                    max_attempts,
+                    now,
+                    now,
+                    now,
+                ),
+            )
+            self._connection.commit()
+
+        logger.info(f"Enqueued {kind} job {job_id} with priority {int(priority)}")
+        return job_id
+
+    def claim(self, worker: str, kinds: Sequence[str] | None = None) -> Job | None:
+        """Atomically take the next runnable job, or None if there is none.
+
+        Args:
+            worker (str): The name of the claiming worker.
+            kinds (Sequence[str] | None, optional): Only claim jobs of these kinds. Defaults to any kind.
+        """
+        now = time.time()
+        kind_filter = ""
+        kind_params: tuple = ()
+        if kinds:
+            kind_filter = f"AND kind IN ({', '.join('?' * len(kinds))})"
+            kind_params = tuple(kinds)
+
+        with self._lock:
+            row = self._connection.execute(
+                f"""
+                UPDATE jobs
+                SET status = ?, attempts = attempts + 1, worker = ?, heartbeat = ?, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = ? AND run_after <= ? {kind_filter}
+                    ORDER BY priority, created_at
+                    LIMIT 1
+                )
+                RETURNING {JOB_COLUMNS}
+                """,
+                (
+                    JobStatus.RUNNING.value,
+                    worker,
+                    now,
+                    now,
+                    JobStatus.QUEUED.value,
+                    now,
+                    *kind_params,
+                ),
+            ).fetchone()
+            self._connection.commit()
+
+        return _to_job(row) if row is not None else None
+
+    def heartbeat(self, job_id: str):
+        """Mark a running job as alive."""
+        self._update(job_id, "heartbeat = ?", (time.time(),))
+
+    def update_progress(self, job_id: str, progress: float, message: str = ""):
+        """Report the progress of a running job, from 0 to 1."""
+        self._update(
+            job_id,
+            "progress = ?, message = ?, heartbeat = ?",
+            (progress, message, time.time()),
+        )
+
+    def complete(self, job_id: str, result: Any = None):
+        """Mark a job as succeeded."""
+        self._update(
+            job_id,
+            "status = ?, progress = 1, result = ?, error = NULL",
+            (JobStatus.SUCCEEDED.value, json.dumps(result)),
+        )
+
+    def fail(self, job_id: str, error: str):
+        """Record a failed attempt, the job is retried with backoff until it runs out of attempts."""
+        job = self.get(job_id)
+        if job is None:
+            return
+
+        if job.attempts < job.max_attempts:
+            delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            logger.warning(
+                f"Job {job_id} failed (attempt {job.attempts}/{job.max_attempts}), retrying in {delay}s: {error}"
+            )
+            self._update(
+                job_id,
+                "status = ?, error = ?, run_after = ?, worker = NULL",
+                (JobStatus.QUEUED.value, error, time.time() + delay),
+            )
+        else:
+            logger.error(f"Job {job_id} failed after {job.attempts} attempts: {error}")
+            self._update(
+                job_id, "status = ?, error = ?", (JobStatus.FAILED.value, error)
+            )
+
+    def requeue_stale(self, timeout: float = settings.JOB_STALE_TIMEOUT) -> int:
+        """Put running jobs whose worker stopped sending heartbeats back in the queue.
+
+        Jobs that already used all their attempts, e.g. because they keep crashing their worker,
+        are failed instead.
+
+        Returns:
+            int: The number of requeued or failed jobs.
+        """
+        now = time.time()
+        stale = "status = ? AND heartbeat < ?"
+        stale_params = (JobStatus.RUNNING.value, now - timeout)
+
+        with self._lock:
+            failed = self._connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                f"WHERE {stale} AND attempts >= max_attempts",
+                (JobStatus.FAILED.value, "Worker stopped", now, *stale_params),
+            ).rowcount
+            requeued = self._connection.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, run_after = ?, updated_at = ? "
+                f"WHERE {stale}",
+                (JobStatus.QUEUED.value, now, now, *stale_params),
+            ).rowcount
+            self._connection.commit()
+
+        if failed or requeued:
+            logger.warning(f"Requeued {requeued} and failed {failed} stale jobs.")
+        return failed + requeued
+
+    def record_invalidation(self, project_id: str):
+        """Record that the data of a project changed, e.g. because it was re-ingested."""
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO project_invalidations (project_id, created_at) VALUES (?, ?)",
+                (project_id, now),
+            )
+            # The log only needs to outlive the caches that read it
+            self._connection.execute(
+                "DELETE FROM project_invalidations WHERE created_at < ?",
+                (now - INVALIDATION_RETENTION,),
+            )
+            self._connection.commit()
+
+    def invalidations_since(self, last_id: int | None) -> tuple[int, list[str]]:
+        """Get the projects invalidated after the invalidation with ID last_id.
+
+        Args:
+            last_id (int | None): The last invalidation already seen, None for a first call,
+                which only returns the current last ID.
+
+        Returns:
+            tuple[int, list[str]]: The ID of the last invalidation and the invalidated projects.
+        """
+        with self._lock:
+            if last_id is None:
+                row = self._connection.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM project_invalidations"
+                ).fetchone()
+                return row[0], []
+
+            rows = self._connection.execute(
+                "SELECT id, project_id FROM project_invalidations WHERE id > ? ORDER BY id",
+                (last_id,),
+            ).fetchall()
+
+        if not rows:
+            return last_id, []
+        return rows[-1][0], list(dict.fromkeys(row[1] for row in rows))
+
+    def get(self, job_id: str) -> Job | None:
+        """Get a job by ID."""
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+        return _to_job(row) if row is not None else None
+
+    def list(self, status: JobStatus | None = None, limit: int = 100) -> list[Job]:
+        """List the most recent jobs, optionally with a given status."""
+        query = f"SELECT {JOB_COLUMNS} FROM jobs"
+        params: tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status.value,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+
+        with self._lock:
+            rows = self._connection.execute(query, (*params, limit)).fetchall()
+
+        return [_to_job(row) for row in rows]
+
+    def _update(self, job_id: str, assignments: str, params: tuple):
+        with self._lock:
+            self._connection.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                (*params, time.time(), job_id),
+            )
+            self._connection.commit()
+
+
+_queue: JobQueue | None = None
+
+
+def get_job_queue() -> JobQueue | None:
+    """Get the job queue of the process, None if JOB_QUEUE_PATH is not set."""
+    global _queue
+
+    if _queue is None and settings.JOB_QUEUE_PATH:
+        _queue = JobQueue(settings.JOB_QUEUE_PATH)
+    return _queue
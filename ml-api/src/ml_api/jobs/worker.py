@@ -0,0 +1,167 @@
+"""
+Worker process pool for the job queue.
+
+Run with `python -m ml_api.jobs.worker --processes N --rag-processes M`. Each worker process
+claims one job at a time and runs it on its own event loop, which is kept for the lifetime of the
+process so the pooled async clients are reused. The N processes run jobs of any kind, the M
+processes only RAG jobs, so interactive requests are not stuck behind hours of bulk ingestion.
+
+The worker is single host only: the queue is a SQLite database (see ml_api.utils.sqlite), which
+can't be shared between hosts (or pods), so it runs next to the API on the same host and is scaled
+with the number of processes, not with replicas.
+
+On SIGTERM the workers finish their current job and exit. A job interrupted by a crash is
+requeued once its heartbeat is older than JOB_STALE_TIMEOUT.
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+
+from ml_api.config import settings
+from ml_api.jobs.queue import RAG_RESPONSE, Job, JobQueue
+
+logger = logging.getLogger(__name__)
+
+
+def _heartbeat(queue: JobQueue, job_id: str, stop: threading.Event):
+    while not stop.wait(settings.JOB_HEARTBEAT_INTERVAL):
+        queue.heartbeat(job_id)
+
+
+def run_job(queue: JobQueue, job: Job, loop: asyncio.AbstractEventLoop):
+    """Run a claimed job and record its outcome."""
+    from ml_api.jobs.handlers import HANDLERS
+
+    logger.info(f"Running {job.kind} job {job.id} (attempt {job.attempts})")
+    started = time.perf_counter()
+
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, args=(queue, job.id, stop_heartbeat), daemon=True
+    )
+    heartbeat.start()
+
+    try:
+        handler = HANDLERS[job.kind]
+        result = loop.run_until_complete(
+            handler(
+                job.payload,
+                lambda progress, message: queue.update_progress(
+                    job.id, progress, message
+                ),
+            )
+        )
+    except Exception as e:
+        logger.error(f"Job {job.id} failed: {e}")
+        queue.fail(job.id, "".join(traceback.format_exception_only(e)).strip())
+    else:
+        queue.complete(job.id, result)
+        logger.info(
+            f"Job {job.id} succeeded in {time.perf_counter() - started:.1f} seconds"
+        )
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+
+
+def run_worker(db_path: str, kinds: list[str] | None = None):
+    """Claim and run jobs, only of the given kinds if any, until SIGTERM or SIGINT."""
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO").upper())
+
+    name = f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue(db_path)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    logger.info(
+        f"Worker {name} started for {', '.join(kinds) if kinds else 'all'} jobs"
+    )
+
+    while not stopping.is_set():
+        job = queue.claim(name, kinds)
+        if job is None:
+            stopping.wait(settings.JOB_POLL_INTERVAL)
+            continue
+        run_job(queue, job, loop)
+
+    from ml_api.utils.clients import close_clients
+
+    loop.run_until_complete(close_clients())
+    loop.close()
+    logger.info(f"Worker {name} stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the job queue worker pool.")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.JOB_WORKER_PROCESSES,
+        help="Number of worker processes running jobs of any kind",
+    )
+    parser.add_argument(
+        "--rag-processes",
+        type=int,
+        default=settings.JOB_RAG_WORKER_PROCESSES,
+        help="Number of extra worker processes reserved for RAG jobs",
+    )
+    parser.add_argument(
+        "--queue-path", default=settings.JOB_QUEUE_PATH, help="Job queue database"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO").upper())
+
+    if not args.queue_path:
+        parser.error("JOB_QUEUE_PATH is not set")
+
+    queue = JobQueue(args.queue_path)
+    context = multiprocessing.get_context("spawn")
+
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    def _start(kinds: list[str] | None) -> multiprocessing.Process:
+        process = context.Process(target=run_worker, args=(args.queue_path, kinds))
+        process.start()
+        return process
+
+    pools: list[list[str] | None] = [None] * args.processes + [
+        [RAG_RESPONSE]
+    ] * args.rag_processes
+    processes = [_start(kinds) for kinds in pools]
+    logger.info(
+        f"Started {args.processes} worker processes and {args.rag_processes} reserved for RAG jobs"
+    )
+
+    # Requeue jobs of dead workers and replace workers that crashed
+    while not stopping.wait(settings.JOB_POLL_INTERVAL * 10):
+        queue.requeue_stale()
+        for i, process in enumerate(processes):
+            if not process.is_alive():
+                logger.warning(
+                    f"Worker process {process.pid} exited with {process.exitcode}, restarting"
+                )
+                processes[i] = _start(pools[i])
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
 import logging
 import os
+from contextlib import asynccontextmanager
 
 import mlflow
 import uvicorn
 from fastapi import FastAPI
 from ml_api.api.ingestion.router import router as ingestion_router
+from ml_api.api.jobs.router import router as jobs_router
 from ml_api.api.router import router
 from ml_api.config import settings
+from ml_api.utils.clients import close_clients, init_clients
 
 logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
@@ -20,9 +23,17 @@ if settings.MLFLOW_LOGGING:
     mlflow.set_experiment("ml-api")
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_clients()
+    yield
+    await close_clients()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(router)
 app.include_router(ingestion_router)
+app.include_router(jobs_router)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,33 @@
+"""
+Prompts for answer synthesis.
+
+vLLM's automatic prefix caching reuses the KV cache of a prompt prefix it has already seen. The
+prefix cache layout puts the parts of the prompt that are the same across questions first: the
+system prompt, then the context with its nodes ordered by chunk ID (not by relevance, which
+depends on the question), and the question last.
+
+The LLM is used as a completion model (see ml_api.utils.llm), which would flatten a chat template
+into "system: ... user: ... assistant: " text. The system prompt is therefore plain text at the
+start of a single completion prompt.
+"""
+
+from llama_index.core.prompts import PromptTemplate
+from ml_api.config import settings
+
+PREFIX_CACHE_CONTEXT_TMPL = (
+    "Context information from multiple sources is below.\n"
+    "---------------------\n"
+    "{context_str}\n"
+    "---------------------\n"
+    "Given the information from multiple sources and not prior knowledge, "
+    "answer the query.\n"
+    "Query: {query_str}\n"
+    "Answer: "
+)
+
+# Braces in the system prompt are literal text, not template variables
+PREFIX_CACHE_PROMPT = PromptTemplate(
+    settings.RAG_SYSTEM_PROMPT.replace("{", "{{").replace("}", "}}")
+    + "\n\n"
+    + PREFIX_CACHE_CONTEXT_TMPL
+)
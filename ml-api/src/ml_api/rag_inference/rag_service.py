@@ -5,17 +5,20 @@ This includes interacting with the retrieval service to get relevant information
 vLLM service to generate an answer.
 """
 
+import asyncio
 import logging
+from typing import Any, AsyncIterator
 
-from llama_index.core import PromptHelper
-from llama_index.core.response import Response
-from llama_index.core.callbacks import LlamaDebugHandler, CallbackManager
-from llama_index.core.response_synthesizers import TreeSummarize
+from llama_index.core.schema import NodeWithScore
 from ml_api.config import settings
-from ml_api.retrieval.retrieval_service import retrieve_points_by_project_id
-from ml_api.utils.llm import get_llm
+from ml_api.retrieval.retrieval_service import (
+    aretrieve_points_by_project_id,
+    aretrieve_points_by_project_id_batch,
+)
+from ml_api.utils.clients import get_clients
 
 from .exceptions import RAGNodesNotFoundException
+from .synthesis import SynthesisStream, asynthesize, select_shared_context
 
 logger = logging.getLogger(__name__)
 
@@ -28,26 +31,206 @@ async def generate_rag_response(query: str, project_id: str) -> str:
     # 2. Use the vLLM service to generate an answer
     # 3. Return the answer
 
-    llm = get_llm()
-
-    nodes = retrieve_points_by_project_id(query, project_id)
+    nodes = await aretrieve_points_by_project_id(query, project_id)
 
     if not nodes:
         raise RAGNodesNotFoundException(f"No nodes found for project id {project_id}")
 
-    prompt_helper = PromptHelper(
-        context_window=settings.LLM_CONTEXT_WINDOW, num_output=settings.LLM_NUM_OUTPUT
+    return await synthesize_rag_response(query, nodes)
+
+
+async def generate_rag_responses(
+    queries: list[str],
+    project_id: str,
+    shared_context: bool = settings.RAG_SHARED_CONTEXT,
+) -> list[str]:
+    """Generates RAG responses for several questions in a specific GEF project.
+
+    Retrieval is batched over all questions, the answers are then generated concurrently. With
+    shared_context all questions are answered from one context, see _shared_streams.
+    """
+
+    nodes_per_query = await aretrieve_points_by_project_id_batch(queries, project_id)
+
+    if not all(nodes_per_query):
+        raise RAGNodesNotFoundException(f"No nodes found for project id {project_id}")
+
+    if shared_context:
+
+        async def _answer(stream: SynthesisStream) -> str:
+            async for _ in stream:
+                pass
+            logger.info(
+                f"Synthesis stats for question {stream.query!r}: {stream.result.stats.to_dict()}"  # type: ignore
+            )
+            return stream.result.answer  # type: ignore
+
+        streams = _shared_streams(queries, nodes_per_query, stream_tokens=True)
+        return await asyncio.gather(*[_answer(stream) for stream in streams])
+
+    return await asyncio.gather(
+        *[
+            synthesize_rag_response(query, nodes)
+            for query, nodes in zip(queries, nodes_per_query)
+        ]
     )
 
-    llama_debug = LlamaDebugHandler(logger=logger)
-    callback_manager = CallbackManager([llama_debug])
-    summarize = TreeSummarize(
-        llm=llm,
-        prompt_helper=prompt_helper,
-        verbose=True,
-        # callback_manager=callback_manager,
-    )  # Can also pass a pydantic object to this
 
-    response: Response = await summarize.asynthesize(query=query, nodes=nodes)  # type: ignore
+class _PrefixWarmingStream(SynthesisStream):
+    """SynthesisStream that waits until the first question of the batch started answering.
+
+    vLLM only reuses a cached prefix once it was computed, so the first question fills the cache
+    and the others are sent when its first token arrives (or it failed).
+    """
+
+    def __init__(self, *args, prefilled: asyncio.Event, first: bool, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefilled = prefilled
+        self.first = first
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        if not self.first:
+            await self.prefilled.wait()
+
+        try:
+            async for delta in super().__aiter__():
+                self.prefilled.set()
+                yield delta
+        finally:
+            self.prefilled.set()
+
+
+def _shared_streams(
+    queries: list[str],
+    nodes_per_query: list[list[NodeWithScore]],
+    stream_tokens: bool,
+) -> list[SynthesisStream]:
+    """Synthesis streams answering all questions from one shared context.
+
+    The context is chosen by select_shared_context and laid out for vLLM's prefix caching, so
+    the KV cache of the system prompt and context is computed once for the batch.
+    """
+    llm = get_clients().llm
+    context = select_shared_context(queries, nodes_per_query, llm)
+    prefilled = asyncio.Event()
+
+    return [
+        _PrefixWarmingStream(
+            query,
+            context,
+            llm=llm,
+            mode="shared",
+            stream_tokens=stream_tokens,
+            prefilled=prefilled,
+            first=index == 0,
+        )
+        for index, query in enumerate(queries)
+    ]
+
+
+async def synthesize_rag_response(query: str, nodes: list[NodeWithScore]) -> str:
+    """Generates an answer to a question from the retrieved nodes."""
+
+    result = await asynthesize(query, nodes, llm=get_clients().llm)
+
+    logger.info(f"Synthesis stats for question {query!r}: {result.stats.to_dict()}")
+
+    return result.answer
+
+
+async def stream_rag_responses(
+    queries: list[str],
+    project_id: str,
+    stream_tokens: bool = True,
+    shared_context: bool = settings.RAG_SHARED_CONTEXT,
+) -> AsyncIterator[dict[str, Any]]:
+    """Generates RAG responses for several questions, yielding events as they are generated.
+
+    Retrieval is batched over all questions and the answers are generated concurrently. Events of
+    different questions are interleaved, each carries the question and its index:
+
+    - {"event": "token", "delta": ...}: a piece of the answer, if stream_tokens is set.
+    - {"event": "answer", "answer": ..., "stats": ...}: the complete answer of a question.
+    - {"event": "error", "error": ...}: the question failed.
+
+    The stream ends with {"event": "done"}. With shared_context the questions that have nodes are
+    answered from one context, see _shared_streams.
+    """
+    events: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    async def _answer(index: int, query: str, stream: SynthesisStream | None):
+        event = {"question": query, "index": index}
+        try:
+            if stream is None:
+                raise RAGNodesNotFoundException(
+                    f"No nodes found for project id {project_id}"
+                )
+
+            async for delta in stream:
+                if stream_tokens:
+                    await events.put({**event, "event": "token", "delta": delta})
+
+            logger.info(
+                f"Synthesis stats for question {query!r}: {stream.result.stats.to_dict()}"  # type: ignore
+            )
+            await events.put(
+                {
+                    **event,
+                    "event": "answer",
+                    "answer": stream.result.answer,  # type: ignore
+                    "stats": stream.result.stats.to_dict(),  # type: ignore
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error generating RAG response for {query!r}: {e}")
+            await events.put({**event, "event": "error", "error": str(e)})
+
+    try:
+        nodes_per_query = await aretrieve_points_by_project_id_batch(
+            queries, project_id
+        )
+    except Exception as e:
+        logger.error(f"Error retrieving nodes for project id {project_id}: {e}")
+        for index, query in enumerate(queries):
+            yield {"question": query, "index": index, "event": "error", "error": str(e)}
+        yield {"event": "done"}
+        return
+
+    streams: list[SynthesisStream | None] = [None] * len(queries)
+    answerable = [i for i, nodes in enumerate(nodes_per_query) if nodes]
+
+    if shared_context and answerable:
+        shared_streams = _shared_streams(
+            [queries[i] for i in answerable],
+            [nodes_per_query[i] for i in answerable],
+            stream_tokens=stream_tokens,
+        )
+        for i, stream in zip(answerable, shared_streams):
+            streams[i] = stream
+    else:
+        for i in answerable:
+            streams[i] = SynthesisStream(
+                queries[i],
+                nodes_per_query[i],
+                llm=get_clients().llm,
+                stream_tokens=stream_tokens,
+            )
+
+    tasks = [
+        asyncio.create_task(_answer(index, query, stream))
+        for index, (query, stream) in enumerate(zip(queries, streams))
+    ]
+
+    try:
+        finished = 0
+        while finished < len(tasks):
+            event = await events.get()
+            if event["event"] in ("answer", "error"):
+                finished += 1
+            yield event
+    finally:
+        # The client disconnected or the stream is done
+        for task in tasks:
+            task.cancel()
 
-    return str(response)
+    yield {"event": "done"}
@@ -0,0 +1,306 @@
+"""
+Context-budget-aware answer synthesis.
+
+TreeSummarize splits the retrieved nodes into as many prompts as the context window requires and
+then summarises the partial answers, so a question whose nodes don't fit in one prompt costs three
+or four LLM calls (with RETRIEVAL_TOP_K=20 and CHUNK_SIZE=512 they never fit). The "packed" mode
+packs the most relevant nodes greedily into a single prompt of LLM_CONTEXT_WINDOW - LLM_NUM_OUTPUT
+tokens, so an answer whose nodes fit is one LLM call that can be streamed. If they don't fit, the
+default "tree" fallback (or "refine") uses every node at the cost of the extra calls, while the
+opt-in "truncate" fallback drops the nodes that don't fit and still makes one call.
+
+Prompt budgets are counted with the LLM's tokenizer if LLM_TOKENIZER is set. Otherwise they are
+counted with tiktoken, which can undercount the tokens of the served model, so
+LLM_TOKEN_SAFETY_MARGIN of the budget is left free.
+
+With the "prefix_cache" prompt layout (see ml_api.rag_inference.prompts) the packed nodes are
+ordered by chunk ID. The "shared" mode answers several questions from one shared context, chosen
+by select_shared_context, so all their prompts share the same prefix.
+"""
+
+import logging
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import AsyncIterator, Callable
+
+from llama_index.core import PromptHelper
+from llama_index.core.callbacks import CallbackManager, TokenCountingHandler
+from llama_index.core.llms import LLM
+from llama_index.core.prompts import BasePromptTemplate
+from llama_index.core.prompts.default_prompt_selectors import (
+    DEFAULT_TREE_SUMMARIZE_PROMPT_SEL,
+)
+from llama_index.core.response_synthesizers import CompactAndRefine, TreeSummarize
+from llama_index.core.schema import MetadataMode, NodeWithScore
+from llama_index.core.utilities.token_counting import TokenCounter
+from ml_api.config import settings
+
+from .prompts import PREFIX_CACHE_PROMPT
+
+logger = logging.getLogger(__name__)
+
+NODE_SEPARATOR = "\n\n"
+
+
+@dataclass
+class SynthesisStats:
+    mode: str  # packed, truncate, tree, refine or shared
+    nodes: int
+    nodes_used: int
+    llm_calls: int
+    prompt_tokens: int
+    completion_tokens: int
+
+    def to_dict(self) -> dict[str, int | str]:
+        return asdict(self)
+
+
+@dataclass
+class SynthesisResult:
+    answer: str
+    stats: SynthesisStats
+
+
+def pack_nodes(texts: list[str], budget: int, token_counter: TokenCounter) -> list[int]:
+    """Greedily pick the texts that fit in a token budget, in order of relevance.
+
+    A text that doesn't fit is skipped and the following (possibly shorter) ones are still tried.
+
+    Returns:
+        list[int]: The indices of the picked texts.
+    """
+    separator_tokens = token_counter.get_string_tokens(NODE_SEPARATOR)
+
+    picked = []
+    used = 0
+    for i, text in enumerate(texts):
+        tokens = token_counter.get_string_tokens(text)
+        if picked:
+            tokens += separator_tokens
+        if used + tokens <= budget:
+            picked.append(i)
+            used += tokens
+
+    return picked
+
+
+@lru_cache(maxsize=1)
+def _load_tokenizer(name: str) -> Callable[[str], list]:
+    # transformers is installed with llama-index-llms-openai-like, which loads tokenizers the same way
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(name).encode
+
+
+def get_llm_tokenizer() -> Callable[[str], list] | None:
+    """The tokenizer of the LLM if LLM_TOKENIZER is set, None for llama-index's default (tiktoken)."""
+    if not settings.LLM_TOKENIZER:
+        return None
+    return _load_tokenizer(settings.LLM_TOKENIZER)
+
+
+def get_prompt_template(
+    llm: LLM, layout: str = settings.RAG_PROMPT_LAYOUT
+) -> BasePromptTemplate:
+    """The single prompt template of the layout, "default" or "prefix_cache"."""
+    if layout == "prefix_cache":
+        return PREFIX_CACHE_PROMPT
+    return DEFAULT_TREE_SUMMARIZE_PROMPT_SEL.select(llm)
+
+
+def get_context_budget(
+    template: BasePromptTemplate,
+    llm: LLM,
+    queries: list[str],
+    token_counter: TokenCounter,
+) -> int:
+    """The tokens left for the context in a prompt, for the longest of the queries."""
+    template_tokens = max(
+        token_counter.get_string_tokens(
+            template.format(llm=llm, context_str="", query_str=query)
+        )
+        for query in queries
+    )
+
+    prompt_tokens = settings.LLM_CONTEXT_WINDOW - settings.LLM_NUM_OUTPUT
+    if get_llm_tokenizer() is None:
+        prompt_tokens = int(prompt_tokens * (1 - settings.LLM_TOKEN_SAFETY_MARGIN))
+    return prompt_tokens - template_tokens
+
+
+def sort_by_chunk_id(nodes: list[NodeWithScore]) -> list[NodeWithScore]:
+    """Order nodes deterministically, independently of the question they were retrieved for."""
+    return sorted(nodes, key=lambda node: node.node.node_id)
+
+
+def select_shared_context(
+    queries: list[str], nodes_per_query: list[list[NodeWithScore]], llm: LLM
+) -> list[NodeWithScore]:
+    """Choose one context for several questions, to be used with the "shared" mode.
+
+    The nodes of all questions are deduplicated and taken round-robin by rank, so each question's
+    most relevant nodes come first, and packed into the context budget of the longest question.
+
+    Returns:
+        list[NodeWithScore]: The shared context, ordered by chunk ID.
+    """
+    candidates: dict[str, NodeWithScore] = {}
+    for rank in range(max((len(nodes) for nodes in nodes_per_query), default=0)):
+        for nodes in nodes_per_query:
+            if rank < len(nodes):
+                candidates.setdefault(nodes[rank].node.node_id, nodes[rank])
+
+    nodes = list(candidates.values())
+    texts = [node.node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes]
+
+    token_counter = TokenCounter(tokenizer=get_llm_tokenizer())
+    budget = get_context_budget(
+        get_prompt_template(llm, "prefix_cache"), llm, queries, token_counter
+    )
+    picked = pack_nodes(texts, budget, token_counter)
+
+    return sort_by_chunk_id([nodes[i] for i in picked])
+
+
+class SynthesisStream:
+    """Answer synthesis that yields the answer as it is generated.
+
+    Single prompt answers (packed, truncate, shared) are streamed token by token from the LLM.
+    Multi-call fallbacks (tree, refine) yield the whole answer at once when it is done. The result,
+    with its stats, is set once the stream is exhausted.
+
+    Args:
+        query (str): The question.
+        nodes (list[NodeWithScore]): The retrieved nodes, most relevant first, or the shared
+            context in "shared" mode.
+        llm (LLM): The LLM, a copy with a per-question token counter is used.
+        mode (str, optional): "packed", "tree" or "shared". Defaults to settings.RAG_SYNTHESIS_MODE.
+        fallback (str, optional): What "packed" does if the nodes don't fit in one prompt: "tree",
+            "refine" or "truncate". Defaults to settings.RAG_SYNTHESIS_FALLBACK.
+        stream_tokens (bool, optional): Whether to stream tokens from the LLM. Defaults to True.
+        layout (str, optional): The prompt layout of "packed", "default" or "prefix_cache". "shared"
+            always uses "prefix_cache". Defaults to settings.RAG_PROMPT_LAYOUT.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        nodes: list[NodeWithScore],
+        llm: LLM,
+        mode: str = settings.RAG_SYNTHESIS_MODE,
+        fallback: str = settings.RAG_SYNTHESIS_FALLBACK,
+        stream_tokens: bool = True,
+        layout: str = settings.RAG_PROMPT_LAYOUT,
+    ):
+        self.query = query
+        self.nodes = nodes
+        self.mode = mode
+        self.fallback = fallback
+        self.stream_tokens = stream_tokens
+        self.layout = "prefix_cache" if mode == "shared" else layout
+        self.result: SynthesisResult | None = None
+
+        self._token_counter = TokenCountingHandler()
+        self._llm = llm.model_copy(
+            update={"callback_manager": CallbackManager([self._token_counter])}
+        )
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        llm = self._llm
+        query = self.query
+        nodes = self.nodes
+        mode = self.mode
+
+        texts = [
+            node.node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes
+        ]
+        picked = list(range(len(nodes)))
+
+        if mode in ("packed", "shared"):
+            template = get_prompt_template(llm, self.layout)
+
+            if mode == "packed":
+                string_token_counter = TokenCounter(tokenizer=get_llm_tokenizer())
+                budget = get_context_budget(
+                    template, llm, [query], string_token_counter
+                )
+                picked = pack_nodes(texts, budget, string_token_counter)
+
+                if len(picked) < len(nodes) and self.fallback != "truncate":
+                    mode = self.fallback
+                    picked = list(range(len(nodes)))
+                elif len(picked) < len(nodes):
+                    mode = "truncate"
+
+                if self.layout == "prefix_cache":
+                    picked.sort(key=lambda i: nodes[i].node.node_id)
+
+        if mode in ("packed", "truncate", "shared"):
+            context_str = NODE_SEPARATOR.join(texts[i] for i in picked)
+
+            if self.stream_tokens:
+                answer_parts = []
+                async for delta in await llm.astream(
+                    template, context_str=context_str, query_str=query
+                ):
+                    answer_parts.append(delta)
+                    yield delta
+                answer = "".join(answer_parts)
+            else:
+                answer = await llm.apredict(
+                    template, context_str=context_str, query_str=query
+                )
+                yield answer
+
+        if mode in ("tree", "refine"):
+            prompt_helper = PromptHelper(
+                context_window=settings.LLM_CONTEXT_WINDOW,
+                num_output=settings.LLM_NUM_OUTPUT,
+                tokenizer=get_llm_tokenizer(),
+            )
+            synthesizer_cls = TreeSummarize if mode == "tree" else CompactAndRefine
+            synthesizer = synthesizer_cls(
+                llm=llm, prompt_helper=prompt_helper, verbose=True
+            )
+            answer = str(await synthesizer.asynthesize(query=query, nodes=nodes))
+            yield answer
+
+        stats = SynthesisStats(
+            mode=mode,
+            nodes=len(nodes),
+            nodes_used=len(picked),
+            llm_calls=len(self._token_counter.llm_token_counts),
+            prompt_tokens=self._token_counter.prompt_llm_token_count,
+            completion_tokens=self._token_counter.completion_llm_token_count,
+        )
+        self.result = SynthesisResult(answer=answer, stats=stats)
+
+
+async def asynthesize(
+    query: str,
+    nodes: list[NodeWithScore],
+    llm: LLM,
+    mode: str = settings.RAG_SYNTHESIS_MODE,
+    fallback: str = settings.RAG_SYNTHESIS_FALLBACK,
+    layout: str = settings.RAG_PROMPT_LAYOUT,
+) -> SynthesisResult:
+    """Generate an answer to a question from the retrieved nodes, counting the LLM calls and tokens.
+
+    See SynthesisStream for the arguments.
+
+    Returns:
+        SynthesisResult: The answer and its stats.
+    """
+    stream = SynthesisStream(
+        query,
+        nodes,
+        llm,
+        mode=mode,
+        fallback=fallback,
+        stream_tokens=False,
+        layout=layout,
+    )
+    async for _ in stream:
+        pass
+
+    return stream.result  # type: ignore
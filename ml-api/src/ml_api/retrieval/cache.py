@@ -0,0 +1,220 @@
+"""
+In-process caches for retrieval.
+
+The SCOPE backend asks the same standard questions for every workspace and source, so the
+same query strings are embedded and the same (query, project) searches are run over and over.
+Query embeddings only depend on the embedding model and are cached until evicted, retrieval
+results are cached for a short time and dropped when their project is re-ingested, as is the
+inventory of document types of a project.
+
+With a job queue, projects are re-ingested by worker processes, so invalidations are also
+recorded in the queue database and every process applies the ones recorded by others before
+reading its caches, at most once every JOB_POLL_INTERVAL seconds.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from llama_index.core.schema import NodeWithScore
+from ml_api.config import settings
+from ml_api.ingestion.naive.gef_documents import DocumentType
+from ml_api.jobs.queue import get_job_queue
+
+
+def normalise_query(query: str) -> str:
+    """Normalise a query for use in a cache key, collapsing whitespace."""
+    return " ".join(query.split())
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any | None:
+        """Get a cached value, or None on a miss."""
+        with self._lock:
+            value = self._get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries if the cache is full."""
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = self._wrap(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate) -> int:
+        """Remove all entries whose key matches the predicate, returns the number removed."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """Get the hit/miss counters and size of the cache."""
+        with self._lock:
+            entries = len(self._entries)
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_size": self.max_size,
+        }
+
+    def _wrap(self, value: Any) -> Any:
+        return value
+
+    def _get(self, key: Hashable) -> Any | None:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+
+class TTLCache(LRUCache):
+    """LRU cache whose entries expire `ttl` seconds after they were stored."""
+
+    def __init__(self, max_size: int, ttl: float):
+        super().__init__(max_size)
+        self.ttl = ttl
+
+    def _wrap(self, value: Any) -> Any:
+        return (time.monotonic() + self.ttl, value)
+
+    def _get(self, key: Hashable) -> Any | None:
+        entry = super()._get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        return value
+
+
+query_embedding_cache = LRUCache(max_size=settings.QUERY_EMBEDDING_CACHE_SIZE)
+retrieval_cache = TTLCache(
+    max_size=settings.RETRIEVAL_CACHE_SIZE, ttl=settings.RETRIEVAL_CACHE_TTL
+)
+doc_type_cache = TTLCache(
+    max_size=settings.RETRIEVAL_CACHE_SIZE, ttl=settings.RETRIEVAL_CACHE_TTL
+)
+
+
+def query_embedding_key(query: str) -> tuple[str, str]:
+    return (settings.TEI_EMBEDDING_MODEL_NAME, normalise_query(query))
+
+
+def retrieval_key(query: str, project_id: str) -> tuple:
+    return (
+        normalise_query(query),
+        project_id,
+        settings.RETRIEVAL_TOP_K,
+        settings.RETRIEVAL_FILTER_DOC_TYPES,
+        settings.RERANKER_URL,
+        settings.RETRIEVAL_RERANK_TOP_K,
+    )
+
+
+def get_cached_nodes(query: str, project_id: str) -> list[NodeWithScore] | None:
+    """Get the cached retrieval result of a query, or None on a miss."""
+    sync_invalidations()
+    nodes = retrieval_cache.get(retrieval_key(query, project_id))
+    return None if nodes is None else list(nodes)
+
+
+def cache_nodes(query: str, project_id: str, nodes: list[NodeWithScore]):
+    """Cache the retrieval result of a query, empty results are not cached."""
+    if nodes:
+        retrieval_cache.put(retrieval_key(query, project_id), list(nodes))
+
+
+def get_cached_doc_types(project_id: str) -> list[DocumentType] | None:
+    """Get the cached document types of a project, or None on a miss."""
+    sync_invalidations()
+    return doc_type_cache.get(project_id)
+
+
+def cache_doc_types(project_id: str, doc_types: list[DocumentType]):
+    """Cache the document types of a project."""
+    doc_type_cache.put(project_id, doc_types)
+
+
+def _drop_project(project_id: str) -> int:
+    doc_type_cache.invalidate(lambda key: key == project_id)
+    return retrieval_cache.invalidate(lambda key: key[1] == project_id)
+
+
+def invalidate_project(project_id: str) -> int:
+    """Drop the cached retrieval results and doc types of a project, e.g. after it was re-ingested.
+
+    The invalidation is recorded in the job queue, if there is one, for the other processes.
+
+    Returns:
+        int: The number of retrieval results dropped in this process.
+    """
+    queue = get_job_queue()
+    if queue is not None:
+        queue.record_invalidation(project_id)
+    return _drop_project(project_id)
+
+
+_last_invalidation_id: int | None = None
+_last_sync = float("-inf")
+_sync_lock = threading.Lock()
+
+
+def sync_invalidations():
+    """Apply the project invalidations recorded by other processes since the last sync."""
+    global _last_invalidation_id, _last_sync
+
+    queue = get_job_queue()
+    if queue is None:
+        return
+
+    with _sync_lock:
+        if time.monotonic() - _last_sync < settings.JOB_POLL_INTERVAL:
+            return
+        _last_sync = time.monotonic()
+
+        _last_invalidation_id, project_ids = queue.invalidations_since(
+            _last_invalidation_id
+        )
+
+    for project_id in project_ids:
+        _drop_project(project_id)
+
+
+def cache_stats() -> dict[str, dict[str, int | float]]:
+    """Get the stats of the retrieval caches."""
+    return {
+        "query_embedding": query_embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "doc_types": doc_type_cache.stats(),
+    }
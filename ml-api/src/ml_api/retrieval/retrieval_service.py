@@ -6,38 +6,351 @@ possibly rewriting the query to something more suitable for knowledge retrieval,
 returning the results.
 """
 
+import asyncio
+import logging
+
 from llama_index.core.schema import NodeWithScore
-from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryMode
+from llama_index.core.vector_stores.types import VectorStoreQueryResult
 from ml_api.config import settings
-from ml_api.utils.embeddings import get_embed_model
-from ml_api.utils.qdrant import get_qdrant_project_id_filter, get_qdrant_vector_store
+from ml_api.ingestion.naive.gef_documents import DocumentType, select_document_types
+from ml_api.retrieval.cache import (
+    cache_doc_types,
+    cache_nodes,
+    get_cached_doc_types,
+    get_cached_nodes,
+    query_embedding_cache,
+    query_embedding_key,
+)
+from ml_api.utils.clients import get_clients
+from ml_api.utils.qdrant import (
+    SPARSE_VECTOR_NAME,
+    get_dense_vector_name,
+    get_qdrant_project_id_filter,
+    get_search_params,
+)
+from ml_api.utils.sparse import bm25_query_vector
+from qdrant_client.http import models as qdrant_models
+
+logger = logging.getLogger(__name__)
 
 
 def retrieve_points_by_project_id(query: str, project_id: str) -> list[NodeWithScore]:
-    """Get relevant information from the Qdrant database."""
+    """Get relevant information from the Qdrant database.
+
+    This blocks on the embedding and Qdrant requests, use aretrieve_points_by_project_id
+    from async code.
+    """
 
     # Steps:
     # 1. Get embedding for the query
     # 2. Query the Qdrant database with a project id filter
-    # 3. Rerank the results (possibly)
+    # 3. Rerank the results (if a reranker is configured)
     # 4. Return the results
 
-    embed_model = get_embed_model()
-    vector_store = get_qdrant_vector_store()
+    cached_nodes = get_cached_nodes(query, project_id)
+    if cached_nodes is not None:
+        return cached_nodes
+
+    clients = get_clients()
+    embed_model = clients.embed_model
+    vector_store = clients.vector_store
+
+    embedding_key = query_embedding_key(query)
+    query_embedding = query_embedding_cache.get(embedding_key)
+    if query_embedding is None:
+        query_embedding = embed_model.get_query_embedding(query)
+        query_embedding_cache.put(embedding_key, query_embedding)
+
+    qdrant_filters = get_qdrant_project_id_filter(
+        project_id=project_id, document_types=get_selected_document_types(project_id)
+    )
+
+    (response,) = clients.qdrant_client.query_batch_points(
+        collection_name=vector_store.collection_name,
+        requests=[_build_query_request(query, query_embedding, qdrant_filters)],
+    )
+
+    nodes = _to_nodes_with_scores(vector_store.parse_to_query_result(response.points))
+    nodes = rerank_nodes(query, nodes)
+    cache_nodes(query, project_id, nodes)
+
+    return nodes
+
+
+async def aretrieve_points_by_project_id(
+    query: str, project_id: str
+) -> list[NodeWithScore]:
+    """Get relevant information from the Qdrant database without blocking the event loop."""
+
+    cached_nodes = get_cached_nodes(query, project_id)
+    if cached_nodes is not None:
+        return cached_nodes
+
+    clients = get_clients()
+    embed_model = clients.embed_model
+    vector_store = clients.vector_store
+
+    embedding_key = query_embedding_key(query)
+    query_embedding = query_embedding_cache.get(embedding_key)
+    if query_embedding is None:
+        query_embedding = await embed_model.aget_query_embedding(query)
+        query_embedding_cache.put(embedding_key, query_embedding)
+
+    qdrant_filters = get_qdrant_project_id_filter(
+        project_id=project_id,
+        document_types=await aget_selected_document_types(project_id),
+    )
+
+    (response,) = await clients.aqdrant_client.query_batch_points(
+        collection_name=vector_store.collection_name,
+        requests=[_build_query_request(query, query_embedding, qdrant_filters)],
+    )
+
+    nodes = _to_nodes_with_scores(vector_store.parse_to_query_result(response.points))
+    nodes = await arerank_nodes(query, nodes)
+    cache_nodes(query, project_id, nodes)
+
+    return nodes
+
+
+async def aretrieve_points_by_project_id_batch(
+    queries: list[str], project_id: str
+) -> list[list[NodeWithScore]]:
+    """Get relevant information for several queries of the same project at once.
+
+    Cached results and embeddings are reused, the remaining queries are embedded in as few TEI
+    requests as possible (see TEI_MAX_BATCH_SIZE) and searched with a single Qdrant batch query,
+    instead of one round-trip of each per query.
+
+    Args:
+        queries (list[str]): The queries.
+        project_id (str): The project to retrieve the points from.
+
+    Returns:
+        list[list[NodeWithScore]]: The retrieved nodes of each query, in the order of the queries.
+    """
+    if not queries:
+        return []
+
+    results: list[list[NodeWithScore] | None] = [
+        get_cached_nodes(query, project_id) for query in queries
+    ]
+    missing = [i for i, nodes in enumerate(results) if nodes is None]
+    if not missing:
+        return results  # type: ignore
+
+    clients = get_clients()
+    vector_store = clients.vector_store
+
+    query_embeddings = [
+        query_embedding_cache.get(query_embedding_key(queries[i])) for i in missing
+    ]
+    to_embed = [j for j, embedding in enumerate(query_embeddings) if embedding is None]
+    if to_embed:
+        new_embeddings = await clients.embed_model.aget_query_embedding_batch(
+            [queries[missing[j]] for j in to_embed]
+        )
+        for j, embedding in zip(to_embed, new_embeddings):
+            query_embeddings[j] = embedding
+            query_embedding_cache.put(
+                query_embedding_key(queries[missing[j]]), embedding
+            )
+
+    qdrant_filters = get_qdrant_project_id_filter(
+        project_id=project_id,
+        document_types=await aget_selected_document_types(project_id),
+    )
+
+    responses = await clients.aqdrant_client.query_batch_points(
+        collection_name=vector_store.collection_name,
+        requests=[
+            _build_query_request(queries[i], query_embedding, qdrant_filters)
+            for i, query_embedding in zip(missing, query_embeddings)
+        ],
+    )
+
+    reranked = await asyncio.gather(
+        *[
+            arerank_nodes(
+                queries[i],
+                _to_nodes_with_scores(
+                    vector_store.parse_to_query_result(response.points)
+                ),
+            )
+            for i, response in zip(missing, responses)
+        ]
+    )
+
+    for i, nodes in zip(missing, reranked):
+        cache_nodes(queries[i], project_id, nodes)
+        results[i] = nodes
+
+    return results  # type: ignore
+
+
+def rerank_nodes(query: str, nodes: list[NodeWithScore]) -> list[NodeWithScore]:
+    """Rerank nodes with the cross-encoder and keep the RETRIEVAL_RERANK_TOP_K most relevant.
+
+    The nodes are returned as is if no reranker is configured (RERANKER_URL).
+    """
+    reranker = get_clients().reranker
+    if reranker is None or not nodes:
+        return nodes
+
+    scores = reranker.rerank(query, [node.node.get_content() for node in nodes])
+    return _keep_top_reranked(nodes, scores)
+
+
+async def arerank_nodes(query: str, nodes: list[NodeWithScore]) -> list[NodeWithScore]:
+    """Async version of rerank_nodes."""
+    reranker = get_clients().reranker
+    if reranker is None or not nodes:
+        return nodes
+
+    scores = await reranker.arerank(query, [node.node.get_content() for node in nodes])
+    return _keep_top_reranked(nodes, scores)
+
+
+def _keep_top_reranked(
+    nodes: list[NodeWithScore], scores: list[float]
+) -> list[NodeWithScore]:
+    reranked = sorted(
+        (
+            NodeWithScore(node=node.node, score=score)
+            for node, score in zip(nodes, scores)
+        ),
+        key=lambda node: node.score,
+        reverse=True,
+    )
+    return reranked[: settings.RETRIEVAL_RERANK_TOP_K]
+
+
+def get_selected_document_types(project_id: str) -> list[str] | None:
+    """Get the document types retrieval is restricted to for a project, see select_document_types.
+
+    Returns None, i.e. no restriction, if RETRIEVAL_FILTER_DOC_TYPES is disabled or none of the
+    prioritised document types were ingested for the project.
+    """
+    if not settings.RETRIEVAL_FILTER_DOC_TYPES:
+        return None
+
+    doc_types = get_cached_doc_types(project_id)
+    if doc_types is None:
+        clients = get_clients()
+        response = clients.qdrant_client.facet(
+            collection_name=clients.vector_store.collection_name,
+            key="doc_type",
+            facet_filter=get_qdrant_project_id_filter(project_id=project_id),
+            limit=len(DocumentType),
+        )
+        doc_types = _parse_doc_type_facet(response)
+        cache_doc_types(project_id, doc_types)
+
+    return _select_document_types(doc_types)
+
 
-    query_embedding = embed_model.get_query_embedding(query)
+async def aget_selected_document_types(project_id: str) -> list[str] | None:
+    """Async version of get_selected_document_types."""
+    if not settings.RETRIEVAL_FILTER_DOC_TYPES:
+        return None
 
-    qdrant_filters = get_qdrant_project_id_filter(project_id=project_id)
+    doc_types = get_cached_doc_types(project_id)
+    if doc_types is None:
+        clients = get_clients()
+        response = await clients.aqdrant_client.facet(
+            collection_name=clients.vector_store.collection_name,
+            key="doc_type",
+            facet_filter=get_qdrant_project_id_filter(project_id=project_id),
+            limit=len(DocumentType),
+        )
+        doc_types = _parse_doc_type_facet(response)
+        cache_doc_types(project_id, doc_types)
 
-    qdrant_query = VectorStoreQuery(
-        query_embedding=query_embedding,
-        similarity_top_k=settings.RETRIEVAL_TOP_K,
-        mode=VectorStoreQueryMode.MMR,
-        mmr_threshold=settings.RETRIEVAL_MMR_THRESHOLD,
+    return _select_document_types(doc_types)
+
+
+def _parse_doc_type_facet(response: qdrant_models.FacetResponse) -> list[DocumentType]:
+    doc_types = []
+    for hit in response.hits:
+        try:
+            doc_types.append(DocumentType(hit.value))
+        except ValueError:
+            logger.warning(f"Unknown document type in Qdrant payload: {hit.value}")
+    return doc_types
+
+
+def _select_document_types(doc_types: list[DocumentType]) -> list[str] | None:
+    selected_types = select_document_types(doc_types)
+    if not selected_types:
+        return None
+    return [doc_type.value for doc_type in selected_types]
+
+
+def _build_query_request(
+    query: str, query_embedding: list[float], qdrant_filters: qdrant_models.Filter
+) -> qdrant_models.QueryRequest:
+    # Qdrant is queried directly rather than through QdrantVectorStore.query, which doesn't
+    # pass on search params (hnsw_ef, quantization rescoring).
+
+    # Over-fetch candidates for the reranker, which keeps RETRIEVAL_RERANK_TOP_K of them
+    limit = (
+        settings.RETRIEVAL_RERANK_CANDIDATES
+        if get_clients().reranker is not None
+        else settings.RETRIEVAL_TOP_K
+    )
+
+    if settings.QDRANT_HYBRID:
+        return _build_ensemble_query_request(
+            query, query_embedding, qdrant_filters, limit
+        )
+
+    return qdrant_models.QueryRequest(
+        query=query_embedding,
+        filter=qdrant_filters,
+        params=get_search_params(),
+        limit=limit,
+        with_payload=True,
     )
 
-    query_results = vector_store.query(qdrant_query, qdrant_filters=qdrant_filters)
 
+def _build_ensemble_query_request(
+    query: str,
+    query_embedding: list[float],
+    qdrant_filters: qdrant_models.Filter,
+    limit: int,
+) -> qdrant_models.QueryRequest:
+    """Ensemble retrieval using BM25 and embeddings.
+
+    The dense and BM25 sparse searches run as prefetches of a single Qdrant query and their
+    results are fused by reciprocal rank on the server.
+    """
+    sparse_indices, sparse_values = bm25_query_vector(query)
+
+    return qdrant_models.QueryRequest(
+        prefetch=[
+            qdrant_models.Prefetch(
+                query=query_embedding,
+                using=get_dense_vector_name(),
+                filter=qdrant_filters,
+                params=get_search_params(),
+                limit=settings.RETRIEVAL_HYBRID_PREFETCH_K,
+            ),
+            qdrant_models.Prefetch(
+                query=qdrant_models.SparseVector(
+                    indices=sparse_indices, values=sparse_values
+                ),
+                using=SPARSE_VECTOR_NAME,
+                filter=qdrant_filters,
+                limit=settings.RETRIEVAL_HYBRID_PREFETCH_K,
+            ),
+        ],
+        query=qdrant_models.FusionQuery(fusion=qdrant_models.Fusion.RRF),
+        limit=limit,
+        with_payload=True,
+    )
+
+
+def _to_nodes_with_scores(query_results: VectorStoreQueryResult) -> list[NodeWithScore]:
     if not query_results.nodes:
         # TODO log this, No nodes found for project id x
         return []
@@ -48,11 +361,3 @@ def retrieve_points_by_project_id(query: str, project_id: str) -> list[NodeWithS
     ]
 
     return nodes_with_scores
-
-
-def ensemble_retrieval(query: str):
-    """Ensemble retrieval results using BM25 and embeddings."""
-
-    # This is a placeholder for possible future implementation.
-
-    pass
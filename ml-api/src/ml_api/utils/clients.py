@@ -0,0 +1,127 @@
+"""
+This file is responsible for holding the clients shared by the whole application.
+
+Constructing a client per request means a new HTTP connection pool, and for Qdrant an extra
+collection round-trip, for every question. The registry is created once in the FastAPI lifespan
+(see ml_api.main) and shared by all requests and ingestion jobs in the process. Outside of the api
+(scripts, workers) it is created on first use.
+"""
+
+import logging
+import threading
+
+import httpx
+from llama_index.llms.openai_like import OpenAILike
+from llama_index.vector_stores.qdrant import QdrantVectorStore
+from ml_api.config import settings
+from ml_api.utils.embeddings import PooledTextEmbeddingsInference, get_embed_model
+from ml_api.utils.http_clients import get_http_limits
+from ml_api.utils.llm import get_llm
+from ml_api.utils.qdrant import get_qdrant_vector_store
+from ml_api.utils.reranker import TEIReranker
+from openai import OpenAI
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """Pooled sync/async clients for Qdrant, TEI (embeddings and reranker) and vLLM."""
+
+    def __init__(self):
+        self.qdrant_client = QdrantClient(url=settings.QDRANT_URL)
+        self.aqdrant_client = AsyncQdrantClient(url=settings.QDRANT_URL)
+        self.embed_model: PooledTextEmbeddingsInference = get_embed_model()
+        # Shared by the per-question copies of the llm made for token accounting
+        self._llm_http_client = httpx.Client(
+            timeout=settings.LLM_TIMEOUT, limits=get_http_limits()
+        )
+        self._llm_async_http_client = httpx.AsyncClient(
+            timeout=settings.LLM_TIMEOUT, limits=get_http_limits()
+        )
+        self.llm: OpenAILike = get_llm(
+            http_client=self._llm_http_client,
+            async_http_client=self._llm_async_http_client,
+        )
+        self.reranker: TEIReranker | None = (
+            TEIReranker() if settings.RERANKER_URL else None
+        )
+
+        self._vector_stores: dict[str, QdrantVectorStore] = {}
+        self._vector_stores_lock = threading.Lock()
+        self._vlm_client: OpenAI | None = None
+
+    @property
+    def vector_store(self) -> QdrantVectorStore:
+        """The vector store of the default collection."""
+        return self.get_vector_store(settings.QDRANT_COLLECTION_NAME)
+
+    def get_vector_store(self, collection_name: str) -> QdrantVectorStore:
+        """Get the vector store of a collection, creating the collection on first use if needed."""
+        with self._vector_stores_lock:
+            if collection_name not in self._vector_stores:
+                self._vector_stores[collection_name] = get_qdrant_vector_store(
+                    collection_name=collection_name,
+                    qdrant_client=self.qdrant_client,
+                    aqdrant_client=self.aqdrant_client,
+                )
+            return self._vector_stores[collection_name]
+
+    @property
+    def vlm_client(self) -> OpenAI:
+        """The OpenAI client of the VLM endpoint used for OCR."""
+        if self._vlm_client is None:
+            if not settings.VLLM_VLM_URL:
+                raise ValueError(
+                    "VLLM_VLM_URL is not set in the environment variables."
+                )
+            self._vlm_client = OpenAI(
+                base_url=settings.VLLM_VLM_URL, api_key=settings.VLLM_API_KEY
+            )
+        return self._vlm_client
+
+    async def aclose(self):
+        """Close all clients and their connection pools."""
+        self.qdrant_client.close()
+        await self.aqdrant_client.close()
+        await self.embed_model.aclose()
+        self._llm_http_client.close()
+        await self._llm_async_http_client.aclose()
+        if self.reranker is not None:
+            await self.reranker.aclose()
+        if self._vlm_client is not None:
+            self._vlm_client.close()
+
+
+_registry: ClientRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def init_clients() -> ClientRegistry:
+    """Create the application client registry, if it doesn't exist yet."""
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            logger.info("Initializing shared clients.")
+            _registry = ClientRegistry()
+        return _registry
+
+
+def get_clients() -> ClientRegistry:
+    """Get the application client registry, creating it on first use."""
+    if _registry is None:
+        return init_clients()
+    return _registry
+
+
+async def close_clients():
+    """Close the application client registry."""
+    global _registry
+
+    with _registry_lock:
+        registry, _registry = _registry, None
+
+    if registry is not None:
+        logger.info("Closing shared clients.")
+        await registry.aclose()
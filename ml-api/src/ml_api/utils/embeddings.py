@@ -1,11 +1,122 @@
 """This file is responsible for providing utilities to interact with embeddings."""
 
+import asyncio
+import threading
+from typing import Any
+
+import httpx
+from llama_index.core.bridge.pydantic import PrivateAttr
 from llama_index.embeddings.text_embeddings_inference import TextEmbeddingsInference
+from llama_index.utils.huggingface import format_query
 from ml_api.config import settings
+from ml_api.utils.http_clients import AsyncClientPool, get_http_limits
+
+# Guards the lazy creation of the clients, which are shared by the threads of the process
+_clients_lock = threading.Lock()
+
+
+class PooledTextEmbeddingsInference(TextEmbeddingsInference):
+    """TextEmbeddingsInference that reuses pooled HTTP connections instead of opening a client per call.
+
+    The clients are created lazily and are not pickled, so the model can still be sent to
+    ingestion pipeline worker processes, which create their own clients. Async clients are
+    bound to the event loop they were created on, so one is kept per loop (see AsyncClientPool).
+    """
+
+    _client: httpx.Client | None = PrivateAttr(default=None)
+    _aclients: AsyncClientPool | None = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "PooledTextEmbeddingsInference"
+
+    def __getstate__(self) -> dict[Any, Any]:
+        state = super().__getstate__()
+        state["__pydantic_private__"] = {
+            **state["__pydantic_private__"],
+            "_client": None,
+            "_aclients": None,
+        }
+        return state
+
+    def _headers(self) -> dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.auth_token is not None:
+            if callable(self.auth_token):
+                auth_token = self.auth_token(self.base_url)
+            else:
+                auth_token = self.auth_token
+            headers["Authorization"] = f"Bearer {auth_token}"
+        return headers
+
+    def _get_client(self) -> httpx.Client:
+        with _clients_lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    base_url=self.base_url,
+                    timeout=self.timeout,
+                    limits=get_http_limits(),
+                )
+            return self._client
+
+    def _get_aclients(self) -> AsyncClientPool:
+        with _clients_lock:
+            if self._aclients is None:
+                self._aclients = AsyncClientPool(self.base_url, self.timeout)
+            return self._aclients
+
+    def _get_aclient(self) -> httpx.AsyncClient:
+        return self._get_aclients().get()
+
+    def _call_api(self, texts: list[str]) -> list[list[float]]:
+        response = self._get_client().post(
+            self.endpoint,
+            headers=self._headers(),
+            json={"inputs": texts, "truncate": self.truncate_text},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def _acall_api(self, texts: list[str]) -> list[list[float]]:
+        response = await self._get_aclient().post(
+            self.endpoint,
+            headers=self._headers(),
+            json={"inputs": texts, "truncate": self.truncate_text},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def aget_query_embedding_batch(self, queries: list[str]) -> list[list[float]]:
+        """Embed queries with one TEI request per TEI_MAX_BATCH_SIZE queries, sent concurrently."""
+        queries = [
+            format_query(query, self.model_name, self.query_instruction)
+            for query in queries
+        ]
+        batches = [
+            queries[i : i + settings.TEI_MAX_BATCH_SIZE]
+            for i in range(0, len(queries), settings.TEI_MAX_BATCH_SIZE)
+        ]
+        results = await asyncio.gather(*[self._acall_api(batch) for batch in batches])
+        return [embedding for result in results for embedding in result]
+
+    def close(self):
+        """Close the sync client, async clients are closed by aclose."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose_current(self):
+        """Close the async client of the running event loop, before a short-lived loop ends."""
+        await self._get_aclients().aclose_current()
+
+    async def aclose(self):
+        """Close all HTTP clients."""
+        self.close()
+        await self._get_aclients().aclose()
 
 
 def get_embed_model():
-    return TextEmbeddingsInference(
+    return PooledTextEmbeddingsInference(
         model_name=settings.TEI_EMBEDDING_MODEL_NAME, base_url=settings.TEI_URL
     )
 
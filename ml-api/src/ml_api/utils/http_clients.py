@@ -0,0 +1,81 @@
+"""This file is responsible for the pooled HTTP clients of the api."""
+
+import asyncio
+import logging
+import threading
+
+import httpx
+from ml_api.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def get_http_limits() -> httpx.Limits:
+    """Connection pool limits shared by the HTTP clients of the api."""
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+class AsyncClientPool:
+    """One pooled httpx.AsyncClient per event loop.
+
+    An async client is bound to the event loop it was created on, so a client that is used from
+    several loops (the api's, a job worker's, ingestion threads') needs one per loop. Code that
+    runs on a short-lived loop, e.g. asyncio.run, must close that loop's client with
+    aclose_current before the loop ends, a client left behind by a closed loop can't be closed
+    anymore and its connections leak. The pool is shared by the threads of the event loops, so
+    the clients are guarded by a lock.
+    """
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url
+        self.timeout = timeout
+        self._clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+
+    def get(self) -> httpx.AsyncClient:
+        """Get the client of the running event loop, creating it if needed."""
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            closed_loops = [l for l in self._clients if l.is_closed()]
+            for closed_loop in closed_loops:
+                del self._clients[closed_loop]
+
+            client = self._clients.get(loop)
+            if client is None:
+                client = self._clients[loop] = httpx.AsyncClient(
+                    base_url=self.base_url,
+                    timeout=self.timeout,
+                    limits=get_http_limits(),
+                )
+
+        if closed_loops:
+            logger.warning(
+                f"Dropped {len(closed_loops)} HTTP clients for {self.base_url} whose event loop "
+                "was closed without closing them, their connections leak"
+            )
+        return client
+
+    async def aclose_current(self):
+        """Close the client of the running event loop, if it has one."""
+        with self._lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def aclose(self):
+        """Close all clients, each on its own event loop."""
+        current = asyncio.get_running_loop()
+        with self._lock:
+            clients, self._clients = self._clients, {}
+
+        for loop, client in clients.items():
+            if loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+                )
@@ -1,10 +1,16 @@
 """This file is responsible for providing utilities to interact with the LLMs."""
 
+import httpx
 from llama_index.llms.openai_like import OpenAILike
 from ml_api.config import settings
 
 
-def get_llm(model_name: str = settings.VLLM_LLM_MODEL_NAME):
+def get_llm(
+    model_name: str = settings.VLLM_LLM_MODEL_NAME,
+    http_client: httpx.Client | None = None,
+    async_http_client: httpx.AsyncClient | None = None,
+):
+    """Get the LLM, pass HTTP clients to share their connection pool between copies of it."""
     return OpenAILike(
         model=model_name,
         api_base=f"{settings.VLLM_LLM_URL}/v1",
@@ -13,4 +19,6 @@ def get_llm(model_name: str = settings.VLLM_LLM_MODEL_NAME):
         max_tokens=settings.LLM_MAX_OUTPUT_TOKENS,
         temperature=settings.LLM_TEMPERATURE,
         timeout=settings.LLM_TIMEOUT,
+        http_client=http_client,
+        async_http_client=async_http_client,
     )  # type: ignore
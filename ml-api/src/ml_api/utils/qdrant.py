@@ -2,60 +2,245 @@
 This file is responsible for providing utilities to send requests to Qdrant.
 """
 
+import logging
+
 from llama_index.vector_stores.qdrant import QdrantVectorStore
+from llama_index.vector_stores.qdrant.base import DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME
 from ml_api.config import settings
-from qdrant_client import QdrantClient
+from ml_api.utils.qdrant_bulk import BulkQdrantVectorStore
+from ml_api.utils.sparse import reciprocal_rank_fusion, sparse_doc_fn, sparse_query_fn
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http import models as qdrant_models
 from qdrant_client.http.models import Distance, VectorParams
 
+logger = logging.getLogger(__name__)
+
+
+def get_payload_index_schemas() -> dict[str, qdrant_models.PayloadSchemaParams]:
+    """The payload indexes of the collection, for the fields retrieval filters on.
+
+    project_id is marked as the tenant field, so Qdrant co-locates the points of a project on disk.
+    """
+    return {
+        "project_id": qdrant_models.KeywordIndexParams(
+            type=qdrant_models.KeywordIndexType.KEYWORD, is_tenant=True
+        ),
+        "doc_type": qdrant_models.KeywordIndexParams(
+            type=qdrant_models.KeywordIndexType.KEYWORD
+        ),
+        "doc_id": qdrant_models.KeywordIndexParams(
+            type=qdrant_models.KeywordIndexType.KEYWORD
+        ),
+    }
+
+
+def get_hnsw_config() -> qdrant_models.HnswConfigDiff:
+    """The HNSW config of the collection.
+
+    With QDRANT_PROJECT_PARTITIONED the global HNSW graph is disabled (m=0) and a graph is built
+    per project_id instead (payload_m), as every query is filtered on a single project.
+    """
+    if settings.QDRANT_PROJECT_PARTITIONED:
+        return qdrant_models.HnswConfigDiff(
+            m=0,
+            payload_m=settings.QDRANT_HNSW_PAYLOAD_M,
+            ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+        )
+
+    return qdrant_models.HnswConfigDiff(
+        m=settings.QDRANT_HNSW_M, ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT
+    )
+
+
+def get_quantization_config() -> qdrant_models.QuantizationConfig | None:
+    """The quantization config of the collection, from QDRANT_QUANTIZATION.
+
+    Scalar quantization stores the vectors as int8 (4x smaller), binary quantization as one bit
+    per dimension (32x smaller, best with rescoring and oversampling at query time).
+    """
+    if settings.QDRANT_QUANTIZATION == "scalar":
+        return qdrant_models.ScalarQuantization(
+            scalar=qdrant_models.ScalarQuantizationConfig(
+                type=qdrant_models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+            )
+        )
+
+    if settings.QDRANT_QUANTIZATION == "binary":
+        return qdrant_models.BinaryQuantization(
+            binary=qdrant_models.BinaryQuantizationConfig(
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            )
+        )
+
+    return None
+
+
+def get_dense_vector_name() -> str:
+    """The name of the dense vector, hybrid collections use named vectors."""
+    return DENSE_VECTOR_NAME if settings.QDRANT_HYBRID else ""
+
+
+def get_vectors_config() -> VectorParams | dict[str, VectorParams]:
+    """The dense vector config of the collection."""
+    vector_params = VectorParams(
+        size=settings.EMBEDDING_SIZE,
+        distance=Distance.COSINE,
+        on_disk=settings.QDRANT_VECTORS_ON_DISK,
+    )
+
+    if settings.QDRANT_HYBRID:
+        return {DENSE_VECTOR_NAME: vector_params}
+    return vector_params
+
+
+def get_sparse_vectors_config() -> dict[str, qdrant_models.SparseVectorParams] | None:
+    """The BM25 sparse vector config of hybrid collections, Qdrant applies the IDF weighting."""
+    if not settings.QDRANT_HYBRID:
+        return None
+
+    return {
+        SPARSE_VECTOR_NAME: qdrant_models.SparseVectorParams(
+            index=qdrant_models.SparseIndexParams(
+                on_disk=settings.QDRANT_VECTORS_ON_DISK
+            ),
+            modifier=qdrant_models.Modifier.IDF,
+        )
+    }
+
+
+def get_search_params() -> qdrant_models.SearchParams | None:
+    """The query time search params, None if all are left at Qdrant's defaults."""
+    quantization = None
+    if settings.QDRANT_QUANTIZATION != "none":
+        quantization = qdrant_models.QuantizationSearchParams(
+            rescore=settings.QDRANT_SEARCH_RESCORE,
+            oversampling=settings.QDRANT_SEARCH_OVERSAMPLING,
+        )
+
+    if quantization is None and settings.QDRANT_SEARCH_HNSW_EF is None:
+        return None
+
+    return qdrant_models.SearchParams(
+        hnsw_ef=settings.QDRANT_SEARCH_HNSW_EF, quantization=quantization
+    )
+
+
+def ensure_payload_indexes(
+    qdrant_client: QdrantClient, collection_name: str
+) -> list[str]:
+    """Create the payload indexes that are missing from a collection.
+
+    Args:
+        qdrant_client (QdrantClient): The Qdrant client.
+        collection_name (str): The collection.
+
+    Returns:
+        list[str]: The fields that were indexed.
+    """
+    existing = qdrant_client.get_collection(collection_name).payload_schema
+
+    created = []
+    for field_name, field_schema in get_payload_index_schemas().items():
+        if field_name in existing:
+            continue
+
+        logger.info(f"Creating payload index on {collection_name}.{field_name}")
+        qdrant_client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=field_schema,
+            wait=True,
+        )
+        created.append(field_name)
+
+    return created
+
 
 def get_qdrant_vector_store(
     collection_name: str = settings.QDRANT_COLLECTION_NAME,
     qdrant_client: QdrantClient | None = None,
     recreate_existing_collection=False,
     create_missing_collection=True,
+    aqdrant_client: AsyncQdrantClient | None = None,
 ) -> QdrantVectorStore:
-    """Get the Qdrant vector store."""
+    """Get the Qdrant vector store.
+
+    This creates new clients and checks the collection every time it is called, use
+    ml_api.utils.clients.get_clients().vector_store to share one across requests.
+    """
 
     if qdrant_client is None:
         qdrant_client = QdrantClient(url=settings.QDRANT_URL)
 
     # Create collection if it doesn't exist
     try:
-        qdrant_client.get_collection(collection_name)
+        collection = qdrant_client.get_collection(collection_name)
     except Exception:
         if create_missing_collection:
             qdrant_client.create_collection(
                 collection_name=collection_name,
-                vectors_config=VectorParams(
-                    size=settings.EMBEDDING_SIZE, distance=Distance.COSINE
-                ),
+                vectors_config=get_vectors_config(),
+                sparse_vectors_config=get_sparse_vectors_config(),
+                hnsw_config=get_hnsw_config(),
+                quantization_config=get_quantization_config(),
             )
+            ensure_payload_indexes(qdrant_client, collection_name)
         else:
             raise
+    else:
+        sparse_vectors = collection.config.params.sparse_vectors or {}
+        if settings.QDRANT_HYBRID and SPARSE_VECTOR_NAME not in sparse_vectors:
+            raise ValueError(
+                f"QDRANT_HYBRID is enabled but collection {collection_name} has no sparse vectors, "
+                "hybrid retrieval needs a new collection (re-ingest into a new QDRANT_COLLECTION_NAME)."
+            )
 
-    vector_store = QdrantVectorStore(
-        collection_name=collection_name, client=qdrant_client
-    )
+    upload_kwargs = {
+        "batch_size": settings.QDRANT_UPLOAD_BATCH_SIZE,
+        "parallel": settings.QDRANT_UPLOAD_PARALLEL,
+        "max_retries": settings.QDRANT_UPLOAD_MAX_RETRIES,
+    }
+
+    if settings.QDRANT_HYBRID:
+        vector_store = BulkQdrantVectorStore(
+            collection_name=collection_name,
+            client=qdrant_client,
+            aclient=aqdrant_client,
+            **upload_kwargs,
+            enable_hybrid=True,
+            sparse_doc_fn=sparse_doc_fn,
+            sparse_query_fn=sparse_query_fn,
+            hybrid_fusion_fn=reciprocal_rank_fusion,
+        )
+    else:
+        vector_store = BulkQdrantVectorStore(
+            collection_name=collection_name,
+            client=qdrant_client,
+            aclient=aqdrant_client,
+            **upload_kwargs,
+        )
 
     return vector_store
 
 
-def get_qdrant_project_id_filter(project_id: str):
-    qdrant_filters = qdrant_models.Filter(
-        must=[
+def get_qdrant_project_id_filter(
+    project_id: str, document_types: list[str] | None = None
+) -> qdrant_models.Filter:
+    """Build the filter for the points of a project, optionally only of some document types."""
+    must = [
+        qdrant_models.FieldCondition(
+            key="project_id", match=qdrant_models.MatchValue(value=str(project_id))
+        )
+    ]
+
+    if document_types:
+        must.append(
             qdrant_models.FieldCondition(
-                key="project_id", match=qdrant_models.MatchValue(value=str(project_id))
+                key="doc_type",
+                match=qdrant_models.MatchAny(any=document_types),
             )
-        ],
-        # should=[
-        #     qdrant_models.FieldCondition(
-        #         key="doc_type",
-        #         match=qdrant_models.MatchAny(
-        #             any=[document_type.value for document_type in document_types]
-        #         ),
-        #     )
-        # ],
-    )
+        )
 
-    return qdrant_filters
+    return qdrant_models.Filter(must=must)
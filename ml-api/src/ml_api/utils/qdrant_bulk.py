@@ -0,0 +1,125 @@
+"""
+This file is responsible for bulk uploads of ingested nodes to Qdrant.
+
+QdrantVectorStore.add uploads batches of 64 points one at a time and waits for each upsert to be
+applied, so Qdrant's write latency dominates full-corpus ingests once embedding is fast.
+BulkQdrantVectorStore sends batches of QDRANT_UPLOAD_BATCH_SIZE points from
+QDRANT_UPLOAD_PARALLEL threads. Without QDRANT_UPLOAD_WAIT the upserts return as soon as Qdrant
+accepted them, and add waits once at the end until all points are visible, so callers (e.g. the
+ingestion manifest) still only see nodes as ingested once they can be retrieved.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from llama_index.core.schema import BaseNode
+from llama_index.vector_stores.qdrant import QdrantVectorStore
+from ml_api.config import settings
+from qdrant_client.http import models as qdrant_models
+from qdrant_client.local.qdrant_local import QdrantLocal
+
+logger = logging.getLogger(__name__)
+
+BARRIER_RETRIEVE_BATCH_SIZE = 1000  # Point IDs checked per request by the barrier
+BARRIER_POLL_INTERVAL = 0.2  # seconds
+
+
+class BulkQdrantVectorStore(QdrantVectorStore):
+    """QdrantVectorStore with parallel, optionally non-blocking, bulk uploads.
+
+    Uploads use threads rather than upload_points' worker processes, upserts are I/O bound and
+    the threads share the client's connection pool.
+    """
+
+    upload_wait: bool = settings.QDRANT_UPLOAD_WAIT
+    barrier_timeout: float = settings.QDRANT_UPLOAD_BARRIER_TIMEOUT
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BulkQdrantVectorStore"
+
+    def add(self, nodes: list[BaseNode], **add_kwargs: Any) -> list[str]:
+        """Add nodes to the collection, returns once all of them are retrievable."""
+        if len(nodes) > 0 and not self._collection_initialized:
+            self._create_collection(
+                collection_name=self.collection_name,
+                vector_size=len(nodes[0].get_embedding()),
+            )
+
+        started = time.perf_counter()
+
+        points, ids = self._build_points(nodes, self.sparse_vector_name())
+        batches = [
+            points[i : i + self.batch_size]
+            for i in range(0, len(points), self.batch_size)
+        ]
+
+        # Local mode (":memory:" or a path) is not thread-safe
+        parallel = 1 if isinstance(self._client._client, QdrantLocal) else self.parallel
+
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            # list() re-raises the first failed upload
+            list(executor.map(self._upsert, batches))
+
+        if not self.upload_wait:
+            self._wait_until_visible(ids)
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Uploaded {len(points)} points to Qdrant in {elapsed:.2f} seconds "
+            f"({len(points) / max(elapsed, 1e-9):.1f} points/s, {len(batches)} batches, "
+            f"{parallel} parallel, wait={self.upload_wait})"
+        )
+        return ids
+
+    def _upsert(self, points: list[qdrant_models.PointStruct]):
+        """Upsert a batch, retrying with exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                self._client.upsert(
+                    collection_name=self.collection_name,
+                    points=points,
+                    wait=self.upload_wait,
+                )
+                return
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(
+                    f"Upserting {len(points)} points failed ({e}), retrying (attempt {attempt})"
+                )
+                time.sleep(2**attempt)
+
+    def _wait_until_visible(self, ids: list[str]):
+        """Consistency barrier, wait until all uploaded points can be retrieved.
+
+        Raises:
+            TimeoutError: If some points are still not visible after barrier_timeout seconds.
+        """
+        deadline = time.monotonic() + self.barrier_timeout
+        pending = list(ids)
+
+        while pending:
+            visible = set()
+            for i in range(0, len(pending), BARRIER_RETRIEVE_BATCH_SIZE):
+                records = self._client.retrieve(
+                    collection_name=self.collection_name,
+                    ids=pending[i : i + BARRIER_RETRIEVE_BATCH_SIZE],
+                    with_payload=False,
+                    with_vectors=False,
+                )
+                visible.update(str(record.id) for record in records)
+
+            pending = [point_id for point_id in pending if point_id not in visible]
+            if not pending:
+                return
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"{len(pending)} uploaded points are not visible in {self.collection_name} "
+                    f"after {self.barrier_timeout} seconds"
+                )
+            time.sleep(BARRIER_POLL_INTERVAL)
@@ -0,0 +1,72 @@
+"""
+Migrate an existing Qdrant collection to the layout created by ml_api.utils.qdrant.
+
+Adds the missing payload indexes (project_id, doc_type, doc_id) and applies the configured
+HNSW parameters (per-project graphs with QDRANT_PROJECT_PARTITIONED), vector storage
+(QDRANT_VECTORS_ON_DISK) and quantization (QDRANT_QUANTIZATION). Qdrant rebuilds the indexes
+in the background, the collection stays available while it does.
+
+Run from the /src directory, e.g.:
+
+    python -m ml_api.utils.qdrant_migrate
+    python -m ml_api.utils.qdrant_migrate --collection my-collection
+"""
+
+import argparse
+import logging
+
+from ml_api.config import settings
+from ml_api.utils.qdrant import (
+    ensure_payload_indexes,
+    get_dense_vector_name,
+    get_hnsw_config,
+    get_quantization_config,
+)
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qdrant_models
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_collection(qdrant_client: QdrantClient, collection_name: str):
+    """Add the payload indexes, HNSW, storage and quantization config of the current layout to a collection."""
+
+    created = ensure_payload_indexes(qdrant_client, collection_name)
+    if created:
+        logger.info(f"Created payload indexes on {collection_name}: {created}")
+    else:
+        logger.info(f"All payload indexes already exist on {collection_name}.")
+
+    hnsw_config = get_hnsw_config()
+    quantization_config = get_quantization_config()
+    logger.info(
+        f"Updating {collection_name}: hnsw={hnsw_config}, quantization={quantization_config}, "
+        f"vectors on_disk={settings.QDRANT_VECTORS_ON_DISK}"
+    )
+    qdrant_client.update_collection(
+        collection_name=collection_name,
+        vectors_config={
+            get_dense_vector_name(): qdrant_models.VectorParamsDiff(
+                on_disk=settings.QDRANT_VECTORS_ON_DISK
+            )
+        },
+        hnsw_config=hnsw_config,
+        # Disabled explicitly, None would leave an existing quantization in place
+        quantization_config=quantization_config or qdrant_models.Disabled.DISABLED,
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--collection", default=settings.QDRANT_COLLECTION_NAME)
+    parser.add_argument("--qdrant-url", default=settings.QDRANT_URL)
+    args = parser.parse_args()
+
+    qdrant_client = QdrantClient(url=args.qdrant_url)
+    migrate_collection(qdrant_client, args.collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""This file is responsible for providing utilities to interact with the reranker service."""
+
+import asyncio
+
+import httpx
+from ml_api.config import settings
+from ml_api.utils.http_clients import AsyncClientPool, get_http_limits
+
+
+class TEIReranker:
+    """Client for the /rerank endpoint of a text-embeddings-inference cross-encoder.
+
+    Texts are scored in requests of at most RERANK_BATCH_SIZE texts, async requests are sent
+    concurrently. Connections are pooled like PooledTextEmbeddingsInference.
+    """
+
+    def __init__(
+        self,
+        base_url: str = settings.RERANKER_URL,
+        batch_size: int = settings.RERANK_BATCH_SIZE,
+        timeout: float = settings.RERANK_TIMEOUT,
+    ):
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+        self._client: httpx.Client | None = None
+        self._aclients = AsyncClientPool(base_url, timeout)
+
+    def _get_client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(
+                base_url=self.base_url, timeout=self.timeout, limits=get_http_limits()
+            )
+        return self._client
+
+    def _batches(self, texts: list[str]) -> list[list[str]]:
+        return [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+
+    @staticmethod
+    def _payload(query: str, texts: list[str]) -> dict:
+        return {"query": query, "texts": texts, "truncate": True}
+
+    @staticmethod
+    def _scores(results: list[dict], batch_size: int) -> list[float]:
+        # The endpoint returns the results sorted by score, put them back in input order
+        scores = [0.0] * batch_size
+        for result in results:
+            scores[result["index"]] = result["score"]
+        return scores
+
+    def rerank(self, query: str, texts: list[str]) -> list[float]:
+        """Score the relevance of each text to the query.
+
+        Args:
+            query (str): The query.
+            texts (list[str]): The texts to score.
+
+        Returns:
+            list[float]: The score of each text, in the order of the texts.
+        """
+        scores = []
+        for batch in self._batches(texts):
+            response = self._get_client().post(
+                "/rerank", json=self._payload(query, batch)
+            )
+            response.raise_for_status()
+            scores.extend(self._scores(response.json(), len(batch)))
+        return scores
+
+    async def arerank(self, query: str, texts: list[str]) -> list[float]:
+        """Async version of rerank, the batches are scored concurrently."""
+
+        async def _rerank_batch(batch: list[str]) -> list[float]:
+            response = await self._aclients.get().post(
+                "/rerank", json=self._payload(query, batch)
+            )
+            response.raise_for_status()
+            return self._scores(response.json(), len(batch))
+
+        results = await asyncio.gather(
+            *[_rerank_batch(batch) for batch in self._batches(texts)]
+        )
+        return [score for result in results for score in result]
+
+    async def aclose(self):
+        """Close all HTTP clients."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        await self._aclients.aclose()
@@ -0,0 +1,115 @@
+"""
+This file is responsible for computing the BM25 sparse vectors used by hybrid retrieval.
+
+GEF documents are full of project codes, place names and acronyms that dense embeddings handle
+poorly, so with QDRANT_HYBRID every chunk also gets a sparse vector of its terms. The vectors are
+computed locally: terms are hashed to a fixed index space and weighted with the BM25 term
+frequency component. The IDF component is applied by Qdrant at query time (Modifier.IDF on the
+sparse vector), as it depends on the whole collection.
+"""
+
+import re
+import zlib
+from collections import Counter
+
+from llama_index.core.vector_stores.types import VectorStoreQueryResult
+from ml_api.config import settings
+
+TOKEN_PATTERN = re.compile(r"\w+")
+RRF_K = 60  # Rank offset of reciprocal rank fusion, the usual default
+
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have in is it its of on or that the their this
+    to was were will with which who whom whose what when where why how not no than then there
+    these those been being also into such can may shall should would could
+    """.split())
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase terms, dropping stopwords and single letters."""
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+
+def term_index(term: str) -> int:
+    """Hash a term to its sparse vector index, stable across processes (unlike hash())."""
+    return zlib.crc32(term.encode("utf-8")) & 0x7FFFFFFF
+
+
+def _to_sparse_vector(weights: dict[str, float]) -> tuple[list[int], list[float]]:
+    # Hash collisions are summed, Qdrant requires unique indices
+    vector: dict[int, float] = {}
+    for term, weight in weights.items():
+        index = term_index(term)
+        vector[index] = vector.get(index, 0.0) + weight
+    return list(vector.keys()), list(vector.values())
+
+
+def bm25_doc_vector(text: str) -> tuple[list[int], list[float]]:
+    """The BM25 term frequency weights of a document."""
+    term_counts = Counter(tokenize(text))
+    doc_length = sum(term_counts.values())
+    length_norm = (
+        1
+        - settings.BM25_B
+        + settings.BM25_B * (doc_length / settings.BM25_AVG_DOC_LENGTH)
+    )
+
+    return _to_sparse_vector(
+        {
+            term: count
+            * (settings.BM25_K1 + 1)
+            / (count + settings.BM25_K1 * length_norm)
+            for term, count in term_counts.items()
+        }
+    )
+
+
+def bm25_query_vector(text: str) -> tuple[list[int], list[float]]:
+    """The weights of a query, every distinct term counts once."""
+    return _to_sparse_vector({term: 1.0 for term in set(tokenize(text))})
+
+
+def sparse_doc_fn(texts: list[str]) -> tuple[list[list[int]], list[list[float]]]:
+    """Sparse document encoder for QdrantVectorStore."""
+    vectors = [bm25_doc_vector(text) for text in texts]
+    return [indices for indices, _ in vectors], [values for _, values in vectors]
+
+
+def sparse_query_fn(texts: list[str]) -> tuple[list[list[int]], list[list[float]]]:
+    """Sparse query encoder for QdrantVectorStore."""
+    vectors = [bm25_query_vector(text) for text in texts]
+    return [indices for indices, _ in vectors], [values for _, values in vectors]
+
+
+def reciprocal_rank_fusion(
+    dense_result: VectorStoreQueryResult,
+    sparse_result: VectorStoreQueryResult,
+    alpha: float = 0.5,
+    top_k: int = 2,
+) -> VectorStoreQueryResult:
+    """Fuse dense and sparse results by reciprocal rank, for QdrantVectorStore's hybrid_fusion_fn.
+
+    Scores of the two retrievers aren't comparable, ranks are. alpha weighs the dense ranks
+    against the sparse ranks, 0.5 weighs them equally.
+    """
+    scores: dict[str, float] = {}
+    nodes = {}
+
+    for result, weight in ((dense_result, alpha), (sparse_result, 1 - alpha)):
+        for rank, node in enumerate(result.nodes or []):
+            nodes[node.node_id] = node
+            scores[node.node_id] = scores.get(node.node_id, 0.0) + weight / (
+                RRF_K + rank + 1
+            )
+
+    node_ids = sorted(scores, key=scores.get, reverse=True)[:top_k]  # type: ignore
+
+    return VectorStoreQueryResult(
+        nodes=[nodes[node_id] for node_id in node_ids],
+        similarities=[scores[node_id] for node_id in node_ids],
+        ids=node_ids,
+    )
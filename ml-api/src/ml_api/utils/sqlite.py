@@ -0,0 +1,84 @@
+"""This file is responsible for providing utilities to work with local SQLite databases.
+
+WAL mode needs a shared-memory index and reliable POSIX locks, which network filesystems (e.g. the
+NFS volume of the deployment) don't provide, so databases on a network filesystem use a rollback
+journal instead. Even then SQLite over NFS is only safe if a single host opens the database at a
+time, which is why the deployment replaces its pod (strategy: Recreate) instead of rolling it.
+"""
+
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+NETWORK_FILESYSTEMS = {
+    "nfs",
+    "nfs4",
+    "cifs",
+    "smb3",
+    "smbfs",
+    "9p",
+    "ceph",
+    "glusterfs",
+    "fuse.sshfs",
+}
+
+
+def get_filesystem_type(path: Path, mounts_file: str = "/proc/mounts") -> str | None:
+    """The type of the filesystem a path is on, None if it can't be determined (e.g. not Linux)."""
+    path = path.resolve()
+    best_mount, best_type = None, None
+
+    try:
+        with open(mounts_file) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Spaces in mount points are escaped as \040
+                mount_point = Path(fields[1].replace("\\040", " "))
+                if path != mount_point and mount_point not in path.parents:
+                    continue
+                if best_mount is None or len(mount_point.parts) >= len(
+                    best_mount.parts
+                ):
+                    best_mount, best_type = mount_point, fields[2]
+    except OSError:
+        return None
+
+    return best_type
+
+
+def connect_sqlite(db_path: Path | str) -> sqlite3.Connection:
+    """Open a SQLite database, creating it (and its parent directories) if needed.
+
+    The connection can be shared between threads, callers are responsible for
+    serialising writes (e.g. with a threading.Lock). WAL mode is enabled so readers
+    don't block the writer, unless the database is on a network filesystem.
+
+    Args:
+        db_path (Path | str): The path to the database file.
+
+    Returns:
+        sqlite3.Connection: The open connection.
+    """
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+
+    filesystem = get_filesystem_type(db_path.parent)
+    if filesystem in NETWORK_FILESYSTEMS:
+        logger.warning(
+            f"SQLite database {db_path} is on a {filesystem} filesystem, using a rollback journal "
+            f"instead of WAL. Only one host may open it at a time (pid {os.getpid()})."
+        )
+        connection.execute("PRAGMA journal_mode=DELETE")
+        connection.execute("PRAGMA synchronous=FULL")
+    else:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+
+    return connection
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+from ml_api.config import settings
+from ml_api.jobs.queue import JobQueue
+from ml_api.retrieval import cache
+from ml_api.retrieval.cache import LRUCache, TTLCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = LRUCache(max_size=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    lru.get("a")
+    lru.put("c", 3)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+
+
+def test_lru_cache_stats():
+    lru = LRUCache(max_size=2)
+    lru.put("a", 1)
+    lru.get("a")
+    lru.get("b")
+
+    assert lru.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+        "entries": 1,
+        "max_size": 2,
+    }
+
+
+def test_lru_cache_disabled():
+    lru = LRUCache(max_size=0)
+    lru.put("a", 1)
+
+    assert lru.get("a") is None
+
+
+def test_lru_cache_invalidate():
+    lru = LRUCache(max_size=10)
+    lru.put(("q", "p1"), 1)
+    lru.put(("q", "p2"), 2)
+
+    assert lru.invalidate(lambda key: key[1] == "p1") == 1
+    assert lru.get(("q", "p1")) is None
+    assert lru.get(("q", "p2")) == 2
+
+
+def test_ttl_cache_expires(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    ttl = TTLCache(max_size=10, ttl=60)
+    ttl.put("a", 1)
+
+    now += 59
+    assert ttl.get("a") == 1
+    now += 1
+    assert ttl.get("a") is None
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    monkeypatch.setattr(cache, "retrieval_cache", TTLCache(max_size=10, ttl=60))
+    monkeypatch.setattr(cache, "doc_type_cache", TTLCache(max_size=10, ttl=60))
+    monkeypatch.setattr(cache, "_last_invalidation_id", None)
+    monkeypatch.setattr(cache, "_last_sync", float("-inf"))
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.0)
+
+
+def test_invalidate_project(caches, monkeypatch):
+    monkeypatch.setattr(cache, "get_job_queue", lambda: None)
+    cache.cache_nodes("question", "p1", ["node"])
+    cache.cache_nodes("question", "p2", ["node"])
+    cache.cache_doc_types("p1", [])
+
+    assert cache.invalidate_project("p1") == 1
+    assert cache.get_cached_nodes("question", "p1") is None
+    assert cache.get_cached_doc_types("p1") is None
+    assert cache.get_cached_nodes("question", "p2") == ["node"]
+
+
+def test_invalidate_project_from_other_process(caches, monkeypatch, tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite")
+    monkeypatch.setattr(cache, "get_job_queue", lambda: queue)
+    cache.cache_nodes("question", "p1", ["node"])
+    cache.cache_nodes("question", "p2", ["node"])
+    assert cache.get_cached_nodes("question", "p1") == ["node"]
+
+    # e.g. a job worker that re-ingested the project
+    JobQueue(tmp_path / "jobs.sqlite").record_invalidation("p1")
+
+    assert cache.get_cached_nodes("question", "p1") is None
+    assert cache.get_cached_nodes("question", "p2") == ["node"]
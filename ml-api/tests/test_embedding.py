@@ -0,0 +1,27 @@
+from ml_api.ingestion.embedding import token_budget_batches
+
+
+def test_token_budget_batches_by_tokens():
+    batches = token_budget_batches(
+        [40, 40, 40, 10], max_batch_size=10, max_batch_tokens=100
+    )
+
+    assert batches == [[0, 1], [2, 3]]
+
+
+def test_token_budget_batches_by_size():
+    batches = token_budget_batches([1] * 5, max_batch_size=2, max_batch_tokens=100)
+
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def test_token_budget_batches_long_text_alone():
+    batches = token_budget_batches(
+        [10, 500, 10], max_batch_size=10, max_batch_tokens=100
+    )
+
+    assert batches == [[0], [1], [2]]
+
+
+def test_token_budget_batches_empty():
+    assert token_budget_batches([], max_batch_size=10, max_batch_tokens=100) == []
@@ -0,0 +1,101 @@
+import pytest
+from ml_api.jobs.queue import (
+    INGEST_PROJECTS,
+    RAG_RESPONSE,
+    JobPriority,
+    JobQueue,
+    JobStatus,
+)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs.sqlite")
+
+
+def test_claim_by_priority(queue):
+    ingest_id = queue.enqueue(INGEST_PROJECTS, {"project_ids": ["1"]})
+    rag_id = queue.enqueue(RAG_RESPONSE, {"question": "q"}, priority=JobPriority.RAG)
+
+    assert queue.claim("worker").id == rag_id
+    assert queue.claim("worker").id == ingest_id
+    assert queue.claim("worker") is None
+
+
+def test_claim_by_kind(queue):
+    queue.enqueue(INGEST_PROJECTS, {})
+
+    assert queue.claim("rag-worker", kinds=[RAG_RESPONSE]) is None
+    assert queue.claim("worker", kinds=[RAG_RESPONSE, INGEST_PROJECTS]) is not None
+
+
+def test_claim_marks_running(queue):
+    job_id = queue.enqueue(RAG_RESPONSE, {"question": "q"})
+    job = queue.claim("worker")
+
+    assert job.id == job_id
+    assert job.status == JobStatus.RUNNING
+    assert job.attempts == 1
+    assert job.payload == {"question": "q"}
+
+
+def test_complete(queue):
+    job_id = queue.enqueue(RAG_RESPONSE, {})
+    queue.claim("worker")
+    queue.complete(job_id, result="answer")
+
+    job = queue.get(job_id)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.result == "answer"
+    assert job.progress == 1
+
+
+def test_fail_retries_with_backoff(queue):
+    job_id = queue.enqueue(RAG_RESPONSE, {}, max_attempts=2)
+    queue.claim("worker")
+    queue.fail(job_id, "backend down")
+
+    job = queue.get(job_id)
+    assert job.status == JobStatus.QUEUED
+    assert job.error == "backend down"
+    # The retry waits for its backoff
+    assert queue.claim("worker") is None
+
+
+def test_fail_after_last_attempt(queue):
+    job_id = queue.enqueue(RAG_RESPONSE, {}, max_attempts=1)
+    queue.claim("worker")
+    queue.fail(job_id, "backend down")
+
+    assert queue.get(job_id).status == JobStatus.FAILED
+
+
+def test_requeue_stale(queue):
+    job_id = queue.enqueue(RAG_RESPONSE, {})
+    queue.claim("worker")
+
+    assert queue.requeue_stale(timeout=60) == 0
+    assert queue.requeue_stale(timeout=-1) == 1
+    assert queue.get(job_id).status == JobStatus.QUEUED
+    assert queue.claim("worker").attempts == 2
+
+
+def test_requeue_stale_fails_job_without_attempts(queue):
+    job_id = queue.enqueue(RAG_RESPONSE, {}, max_attempts=1)
+    queue.claim("worker")
+
+    assert queue.requeue_stale(timeout=-1) == 1
+    assert queue.get(job_id).status == JobStatus.FAILED
+
+
+def test_invalidations_since(queue):
+    last_id, projects = queue.invalidations_since(None)
+    assert projects == []
+
+    queue.record_invalidation("p1")
+    queue.record_invalidation("p2")
+    queue.record_invalidation("p1")
+
+    last_id, projects = queue.invalidations_since(last_id)
+    assert projects == ["p1", "p2"]
+    assert queue.invalidations_since(last_id) == (last_id, [])
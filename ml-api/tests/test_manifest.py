@@ -0,0 +1,64 @@
+import os
+
+from ml_api.ingestion.manifest import FileState, IngestionManifest
+
+
+def test_check_new_file(tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    file = tmp_path / "p1_doc1.txt"
+    file.write_text("content")
+
+    assert manifest.check(file) == (FileState.NEW, None)
+
+
+def test_record_then_unchanged(tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    file = tmp_path / "p1_doc1.txt"
+    file.write_text("content")
+
+    manifest.record(file, ["a", "b"])
+    state, entry = manifest.check(file)
+
+    assert state == FileState.UNCHANGED
+    assert entry.node_ids == ["a", "b"]
+
+
+def test_changed_content(tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    file = tmp_path / "p1_doc1.txt"
+    file.write_text("content")
+    manifest.record(file, ["a"])
+
+    file.write_text("new content")
+    state, entry = manifest.check(file)
+
+    assert state == FileState.CHANGED
+    assert entry.node_ids == ["a"]
+
+
+def test_touched_file_with_same_content_is_unchanged(tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    file = tmp_path / "p1_doc1.txt"
+    file.write_text("content")
+    manifest.record(file, ["a"])
+
+    stat = file.stat()
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert manifest.check(file)[0] == FileState.UNCHANGED
+    # The stat was refreshed, so the next check doesn't hash the file again
+    assert manifest.get(file).mtime_ns == file.stat().st_mtime_ns
+
+
+def test_record_clears_failure(tmp_path):
+    manifest = IngestionManifest(tmp_path / "manifest.sqlite")
+    file = tmp_path / "p1_doc1.txt"
+    file.write_text("content")
+
+    manifest.record_failure(file, "Parsing timed out")
+    assert manifest.failures_under(tmp_path) == {
+        str(file.resolve()): "Parsing timed out"
+    }
+
+    manifest.record(file, [])
+    assert manifest.failures_under(tmp_path) == {}
@@ -0,0 +1,27 @@
+from ml_api.ingestion.parsing import parse_files
+
+
+def test_parse_files(tmp_path):
+    file = tmp_path / "p12_doc1__prodoc.txt"
+    file.write_text("Project document")
+
+    [result] = parse_files([file], num_workers=1)
+
+    assert result.ok
+    assert result.file == file
+    assert result.documents[0].text == "Project document"
+    assert result.documents[0].metadata["project_id"] == "12"
+
+
+def test_parse_files_timeout(tmp_path):
+    files = [tmp_path / f"p12_doc{i}__prodoc.txt" for i in range(3)]
+    for file in files:
+        file.write_text("Project document")
+
+    # No parser can finish before a deadline that has already passed
+    results = list(parse_files(files, num_workers=2, timeout=0))
+
+    assert sorted(result.file for result in results) == sorted(files)
+    for result in results:
+        assert not result.ok
+        assert "timed out" in result.error
@@ -0,0 +1,50 @@
+from ml_api.config import settings
+from ml_api.utils.sparse import (
+    bm25_doc_vector,
+    bm25_query_vector,
+    sparse_doc_fn,
+    term_index,
+    tokenize,
+)
+
+
+def test_tokenize_drops_stopwords_and_letters():
+    assert tokenize("The GEF-7 project of Kenya a") == ["gef", "7", "project", "kenya"]
+
+
+def test_term_index_is_stable():
+    assert term_index("biodiversity") == term_index("biodiversity")
+    assert term_index("biodiversity") != term_index("mitigation")
+
+
+def test_bm25_doc_vector_weights():
+    indices, values = bm25_doc_vector("mangrove mangrove restoration")
+    weights = dict(zip(indices, values))
+
+    assert len(indices) == len(set(indices)) == 2
+    assert weights[term_index("mangrove")] > weights[term_index("restoration")]
+    # The term frequency component saturates at k1 + 1
+    assert all(0 < value < settings.BM25_K1 + 1 for value in values)
+
+
+def test_bm25_doc_vector_length_normalisation():
+    short = dict(zip(*bm25_doc_vector("mangrove")))
+    long = dict(zip(*bm25_doc_vector("mangrove " + "restoration " * 500)))
+
+    assert short[term_index("mangrove")] > long[term_index("mangrove")]
+
+
+def test_bm25_query_vector_counts_terms_once():
+    indices, values = bm25_query_vector("mangrove mangrove restoration")
+
+    assert sorted(indices) == sorted(
+        [term_index("mangrove"), term_index("restoration")]
+    )
+    assert values == [1.0, 1.0]
+
+
+def test_sparse_doc_fn_batches():
+    indices, values = sparse_doc_fn(["mangrove", "restoration project"])
+
+    assert [len(i) for i in indices] == [1, 2]
+    assert [len(v) for v in values] == [1, 2]
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+from ml_api.ingestion.streaming import prefetch, window_by_size
+
+
+def test_window_by_size_count():
+    assert list(window_by_size(range(5), max_size=2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_window_by_size_with_size_fn():
+    windows = window_by_size([3, 1, 1, 5, 2], max_size=4, size_fn=lambda x: x)
+
+    # An item larger than max_size gets a window of its own
+    assert list(windows) == [[3, 1], [1], [5], [2]]
+
+
+def test_window_by_size_max_items():
+    windows = window_by_size(range(5), max_size=100, max_items=2)
+
+    assert list(windows) == [[0, 1], [2, 3], [4]]
+
+
+def test_prefetch_keeps_order():
+    assert list(prefetch(range(100), max_in_flight=3)) == list(range(100))
+
+
+def test_prefetch_without_buffer():
+    assert list(prefetch(iter([1, 2]), max_in_flight=0)) == [1, 2]
+
+
+def test_prefetch_bounds_items_in_flight():
+    produced = 0
+    lock = threading.Lock()
+
+    def produce():
+        nonlocal produced
+        for i in range(20):
+            with lock:
+                produced += 1
+            yield i
+
+    items = prefetch(produce(), max_in_flight=2)
+    next(items)
+
+    # The consumed item, the buffered items and the one the producer is blocked on
+    threading.Event().wait(0.3)
+    with lock:
+        assert produced <= 4
+    items.close()
+
+
+def test_prefetch_reraises_producer_error():
+    def produce():
+        yield 1
+        raise ValueError("parse failed")
+
+    items = prefetch(produce(), max_in_flight=2)
+
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="parse failed"):
+        next(items)
@@ -0,0 +1,74 @@
+from docx import Document as DocxDocument
+from ml_api.ingestion.tables import split_rows, table_rows, table_to_markdown
+
+
+def _count_words(text: str) -> int:
+    return len(text.split())
+
+
+def test_table_rows():
+    table = DocxDocument().add_table(rows=2, cols=3)
+    for cell, text in zip(table.rows[0].cells, ["Component", "Outcome", "USD"]):
+        cell.text = text
+    for cell, text in zip(table.rows[1].cells, ["1", "Restored | protected", ""]):
+        cell.text = text
+
+    assert table_rows(table) == [
+        ["Component", "Outcome", "USD"],
+        ["1", "Restored \\| protected", ""],
+    ]
+
+
+def test_table_rows_merged_cells():
+    table = DocxDocument().add_table(rows=3, cols=3)
+    table.cell(0, 0).merge(table.cell(0, 2)).text = "Results framework"
+    table.cell(1, 0).merge(table.cell(2, 0)).text = "Component 1"
+    table.cell(1, 1).text = "Outcome 1.1"
+    table.cell(2, 1).text = "Outcome 1.2"
+
+    assert table_rows(table) == [
+        # A horizontally merged cell has its text in its first column
+        ["Results framework", "", ""],
+        # A vertically merged cell repeats its text in every row
+        ["Component 1", "Outcome 1.1", ""],
+        ["Component 1", "Outcome 1.2", ""],
+    ]
+
+
+def test_table_rows_nested_table():
+    table = DocxDocument().add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "Risks"
+    nested = table.cell(0, 1).add_table(rows=2, cols=2)
+    nested.cell(0, 0).text = "Flood"
+    nested.cell(0, 1).text = "High"
+    nested.cell(1, 0).text = "Drought"
+    nested.cell(1, 1).text = "Low"
+
+    assert table_rows(table) == [["Risks", "Flood; High<br>Drought; Low"]]
+
+
+def test_table_to_markdown():
+    assert table_to_markdown(["a", "b"], [["1", "2"]]) == (
+        "| a | b |\n| --- | --- |\n| 1 | 2 |"
+    )
+
+
+def test_split_rows():
+    header = ["a", "b"]
+    rows = [["one two", "three"]] * 5
+
+    parts = split_rows(header, rows, max_tokens=20, count_tokens=_count_words)
+
+    assert [row for part in parts for row in part] == rows
+    assert len(parts) > 1
+    for part in parts:
+        assert _count_words(table_to_markdown(header, part)) <= 20
+
+
+def test_split_rows_long_row_alone():
+    header = ["a"]
+    rows = [["short"], ["very " * 50], ["short"]]
+
+    parts = split_rows(header, rows, max_tokens=20, count_tokens=_count_words)
+
+    assert parts == [[rows[0]], [rows[1]], [rows[2]]]